@@ -6,3 +6,6 @@ from algs.greedy import *
 from algs.batching import *
 from algs.deferred import *
 from algs.lookahead import *
+from algs.max_weight import *
+from algs.offline import *
+from algs.vectorized_greedy import *
@@ -1,14 +1,21 @@
 from collections import defaultdict
+import numpy as np
+from scipy import sparse
+
+import kernels
 from algs.algorithms import OnlineWeightMatchingAlgorithm
 
 class DynamicDeferredAcceptance(OnlineWeightMatchingAlgorithm):
     # See algorithm 4.
-    def __init__(self, stochastic=False, guess=0):
+    def __init__(self, stochastic=False, guess=0, incremental=False,
+                 eps_scaling=False, scaling_factor=4, vectorized=False):
         self.price_s = defaultdict(float)
         # p from the algorithm is something like value
         # self.price_s is seller_index -> to -> value
         self.matching_s = dict() # matches (index)
         # self.matching_s is seller_index -> to -> matched_buyer_index
+        self.seller_of_b = dict()
+        # inverse of self.matching_s: buyer_index -> to -> seller_index
         self.marginal_profit_b = defaultdict(float)
         # self.marginal_profit_b q_b from the algorithm. For each buyer->seller
         # match made
@@ -19,6 +26,33 @@ class DynamicDeferredAcceptance(OnlineWeightMatchingAlgorithm):
         # needed for batching.
         self.stochastic = stochastic
         self.guess = guess
+        self.incremental = incremental
+        # keep prices and tentative matches across steps, only repairing the
+        # auction for what changed (see _repair_auction)
+        self._known_b = dict()
+        self._known_s = dict()
+        # buyers / sellers in market at the last step (dicts as ordered sets)
+        self._warm_sim = None
+        self._warm_epoch = None
+        self._warm_changes = None
+        # warm state is only valid for this sim and sim.weight_epoch, and is
+        # repaired for the candidate pairs that changed (sim.candidate_changes)
+        self.eps_scaling = eps_scaling
+        self.scaling_factor = scaling_factor
+        # run the auction with eps starting near the largest weight and divided
+        # by scaling_factor each round until it reaches self.eps, with bids
+        # jumping to the second best profit (see _scaled_auction)
+        if incremental and eps_scaling:
+            raise ValueError("incremental and eps_scaling cannot be combined")
+        self.vectorized = vectorized
+        # run _process_buyers on sim.snapshot() with prices in a NumPy array
+        # (see _vectorized_auction)
+        if vectorized and (incremental or eps_scaling):
+            raise ValueError("vectorized cannot be combined with incremental or eps_scaling")
+        self._bid_sellers = dict()
+        # buyer -> (sellers, weights) it may bid on, for the current step (see _bid_list)
+        self._profit_b = dict()
+        # matched buyer -> weight - price of its seller, kept by _scaled_auction
 
     def compute_matching(self, sim):
         """
@@ -30,8 +64,18 @@ class DynamicDeferredAcceptance(OnlineWeightMatchingAlgorithm):
             buyer and seller are indexes into sim.G for the appropriate node.
 
         """
-        self._reset_internals()
-        self._process_buyers(sim)
+        self._bid_sellers = dict()
+        if self.incremental:
+            self._repair_auction(sim)
+        elif self.eps_scaling:
+            self._reset_internals()
+            self._scaled_auction(sim)
+        elif self.vectorized:
+            self._reset_internals()
+            self._vectorized_auction(sim)
+        else:
+            self._reset_internals()
+            self._process_buyers(sim)
         return self._process_critical_sellers(sim)
 
     def _process_buyers(self, sim):
@@ -39,12 +83,33 @@ class DynamicDeferredAcceptance(OnlineWeightMatchingAlgorithm):
         Go through all buyer nodes in arrival order, conducting an ascending
         auction to create a tentative seller, buyer match.
         """
-        for node_index in range(sim.n + 1):
-            # not iterating over buyers set because order matters
-            if node_index not in sim.G.nodes: continue # node has been removed
-            # assert sim.G.nodes[node_index]['in_market']
-            if node_index in sim.buyer_nodes:
-                self._conduct_ascending_auction(sim, node_index)
+        for node_index in sim.buyer_nodes:
+            # buyer_nodes iterates in arrival order, which matters here
+            self._conduct_ascending_auction(sim, node_index)
+
+    def _vectorized_auction(self, sim):
+        """
+        _process_buyers on the in-market weight matrix, with the same
+        tentative matching and prices.
+
+        The auction runs on the snapshot's CSR rows, so a bid only looks at
+        the pairs stored there (edges with a nonzero weight). Columns
+        (sellers) are in arrival order and the first maximum is taken, so
+        bids break ties like _argmax. Zero weights never give a positive
+        profit, so leaving them out changes no bid; only the marginal
+        profits of buyers that do not bid can differ from _argmax's (they
+        are <= 0 either way).
+        """
+        snap = sim.snapshot()
+        owner, prices, profits = ascending_auction(snap.weights, self.eps)
+        buyers, sellers = snap.buyers.tolist(), snap.sellers.tolist()
+        for j in np.flatnonzero(owner >= 0).tolist():
+            b = buyers[owner[j]]
+            self.matching_s[sellers[j]] = b
+            self.seller_of_b[b] = sellers[j]
+        for j in np.flatnonzero(prices).tolist():
+            self.price_s[sellers[j]] = prices[j].item()
+        self.marginal_profit_b.update(zip(buyers, profits.tolist()))
 
     def _conduct_ascending_auction(self, sim, node_index):
         terminate = False
@@ -55,7 +120,9 @@ class DynamicDeferredAcceptance(OnlineWeightMatchingAlgorithm):
                 prev_b = None
                 if s in self.matching_s:
                     prev_b = self.matching_s[s]
+                    del self.seller_of_b[prev_b]
                 self.matching_s[s] = b
+                self.seller_of_b[b] = s
                 self.price_s[s] += self.eps
                 b = prev_b
             terminate = (b is None or self.marginal_profit_b[b] <= 0)
@@ -71,37 +138,356 @@ class DynamicDeferredAcceptance(OnlineWeightMatchingAlgorithm):
 
         """
         matchings_reversed = {} # buyer : seller
-        for node_index in range(sim.n + 1):
-            # not iterating over sellers set because order matters
-            if node_index in sim.seller_nodes:
-                if self.stochastic:
-                    age_of_node = sim.t - sim.G.nodes[node_index]["added_at"]
-                    if self.probably_critical(age_of_node) and node_index in self.matching_s:
-                        matchings_reversed[self.matching_s[node_index]] = node_index
-                else:
-                    if sim.is_critical(node_index, self.critical_at) and node_index in self.matching_s:
-                        matchings_reversed[self.matching_s[node_index]] = node_index
+        if self.stochastic:
+            # seller_nodes is in arrival order, so sellers only get younger
+            for node_index in sim.seller_nodes:
+                age_of_node = sim.t - sim.node_attr(node_index, 'added_at')
+                if not self.probably_critical(age_of_node):
+                    break
+                if node_index in self.matching_s:
+                    matchings_reversed[self.matching_s[node_index]] = node_index
+        else:
+            for node_index in sim.critical_sellers(self.critical_at):
+                # critical_sellers is in arrival order, which matters here
+                if node_index in self.matching_s:
+                    matchings_reversed[self.matching_s[node_index]] = node_index
         return [(buyer, seller) for buyer, seller in matchings_reversed.items()]
 
+    def _repair_auction(self, sim):
+        """
+        Incremental version of _reset_internals + _process_buyers.
+
+        Prices and tentative matches from the last step are kept. Every buyer
+        they leave matched is within eps of its best profit, every unmatched
+        buyer has no positive profit, and unmatched sellers have price 0.
+        This repairs those conditions for what changed since then, and only
+        the buyers involved bid again:
+          - sellers that left (matched or expired) release their buyer
+          - buyers that left release their seller, whose price drops to 0
+          - a tentative match whose pair stopped being a candidate (top_k)
+            is undone as if the buyer had left, and the buyer bids again
+          - a buyer that got a new candidate seller bids again if it now
+            prefers that seller by more than eps
+          - new buyers bid
+          - new and released sellers (price 0) pull in any buyer that now
+            prefers them by more than eps; that buyer's seller is released in
+            turn
+        The result satisfies the same conditions as a run from scratch, so
+        both are within eps * (number of matches) of the max weight matching.
+        """
+        since = None
+        if sim is self._warm_sim and sim.weight_epoch == self._warm_epoch:
+            since = self._warm_changes
+        changes, self._warm_changes = sim.candidate_changes(since)
+        if changes is None:
+            # new sim, reset, weights recalculated or changes lost: start over
+            self._reset_internals()
+            self._known_b = dict()
+            self._known_s = dict()
+            self._warm_sim = sim
+            self._warm_epoch = sim.weight_epoch
+            changes = []
+
+        to_bid = dict() # buyers to run the auction for (dict as ordered set)
+        fresh = dict() # sellers at price 0 that buyers have not been checked against
+
+        for s in [s for s in self._known_s if s not in sim.seller_nodes]:
+            del self._known_s[s]
+            self.price_s.pop(s, None)
+            b = self.matching_s.pop(s, None)
+            if b is not None:
+                del self.seller_of_b[b]
+                if b in sim.buyer_nodes:
+                    to_bid[b] = None
+        for b in [b for b in self._known_b if b not in sim.buyer_nodes]:
+            del self._known_b[b]
+            self.marginal_profit_b.pop(b, None)
+            s = self.seller_of_b.pop(b, None)
+            if s is not None:
+                self._release_seller(s, fresh)
+
+        new_pairs = []
+        for b, s, added in changes:
+            if b not in self._known_b or s not in self._known_s:
+                continue
+            if added:
+                new_pairs.append((b, s))
+            elif self.matching_s.get(s) == b:
+                del self.seller_of_b[b]
+                self._release_seller(s, fresh)
+                to_bid[b] = None
+        for b, s in new_pairs:
+            if b in to_bid or not sim.has_edge(b, s):
+                continue
+            s_b = self.seller_of_b.get(b)
+            if s_b is None:
+                threshold = 0
+            else:
+                threshold = sim.weight(b, s_b) - self.price_s[s_b] + self.eps
+            if sim.weight(b, s) - self.price_s[s] > threshold:
+                to_bid[b] = None
+                if s_b is not None:
+                    del self.seller_of_b[b]
+                    self._release_seller(s_b, fresh)
+
+        for s in sim.seller_nodes:
+            if s not in self._known_s and sim.node_attr(s, 'in_market'):
+                self._known_s[s] = None
+                fresh[s] = None
+        for b in sim.buyer_nodes:
+            if b not in self._known_b and sim.node_attr(b, 'in_market'):
+                self._known_b[b] = None
+                to_bid[b] = None
+
+        while fresh:
+            # only the buyers with an edge to a fresh seller can want it
+            released = dict()
+            thresholds = dict()
+            for s in fresh:
+                for b, w_bs in sim.neighbors(s):
+                    if b in to_bid or b not in self._known_b:
+                        continue
+                    threshold = thresholds.get(b)
+                    if threshold is None:
+                        s_b = self.seller_of_b.get(b)
+                        if s_b is None:
+                            threshold = 0  # unmatched: any positive profit
+                        else:
+                            threshold = sim.weight(b, s_b) - self.price_s[s_b] + self.eps
+                        thresholds[b] = threshold
+                    if w_bs > threshold:
+                        to_bid[b] = None
+                        s_b = self.seller_of_b.pop(b, None)
+                        if s_b is not None:
+                            self._release_seller(s_b, released)
+            fresh = released
+
+        for b in sorted(to_bid):
+            # arrival order, as in _process_buyers
+            self._conduct_ascending_auction(sim, b)
+
+    def _scaled_auction(self, sim):
+        """
+        eps-scaling version of _process_buyers.
+
+        eps starts at the largest weight divided by scaling_factor and is
+        divided by scaling_factor each phase until it reaches self.eps. In a
+        phase, buyers bid in arrival order with that phase's eps, and a bid
+        raises the price by (best profit - second best profit + eps), where
+        doing nothing counts as a profit of 0; then _settle_unmatched_sellers
+        lowers the prices of sellers left unmatched, with the same eps.
+        Between phases the prices and the tentative matches are kept; only
+        the matched buyers that are no longer within the new eps of their
+        best profit give up their seller and bid again. Early phases settle
+        the prices coarsely, so later phases need few bids.
+
+        The result satisfies the same conditions as _process_buyers: matched
+        buyers within self.eps of their best profit, unmatched buyers without
+        positive profit, unmatched sellers at price 0. So the tentative
+        matching is within self.eps * (number of matches) of the max weight
+        matching.
+        """
+        buyers = list(sim.buyer_nodes)
+        max_weight = max(
+            [w for b in buyers for s, w in self._valid_sellers(b, sim)],
+            default=0)
+        eps = max(max_weight / self.scaling_factor, self.eps)
+        self._profit_b = dict()
+        to_bid = buyers
+        while True:
+            for b in to_bid:
+                self._conduct_scaled_auction(sim, b, eps)
+            self._settle_unmatched_sellers(sim, eps)
+            if eps <= self.eps:
+                break
+            eps = max(eps / self.scaling_factor, self.eps)
+            # eps-complementary slackness for the new eps. Unmatched buyers
+            # have no positive profit, whatever eps.
+            to_bid = []
+            for b in buyers:
+                s = self.seller_of_b.get(b)
+                if s is None:
+                    continue
+                best = max(self._argmax(b, sim)[1], 0)
+                if self._profit_b[b] < best - eps:
+                    del self.seller_of_b[b]
+                    del self.matching_s[s]
+                    to_bid.append(b)
+
+    def _settle_unmatched_sellers(self, sim, eps):
+        """
+        Reverse auction step for unmatched sellers with a positive price,
+        with the eps of the current phase.
+
+        Each buyer values such a seller at its weight minus the buyer's
+        current profit (its weight + eps for unmatched buyers, so they never
+        end up with a positive profit). If no buyer values the seller above
+        eps, its price drops to 0. Otherwise the buyer valuing it most takes
+        it at the second highest value - eps (floored at 0), which raises that
+        buyer's profit by at least eps and leaves every other buyer within eps
+        of its best profit; the buyer's old seller is then settled in turn.
+        Profits only go up, so this stops, and prices of matched sellers are
+        left alone.
+        """
+        profit_b = self._profit_b
+        stale = [s for s in self.price_s if s not in self.matching_s and self.price_s[s] > 0]
+        while stale:
+            s = stale.pop()
+            best_b, best_w, best_value, second_value = None, 0, -100000, 0
+            for b, w_bs in sim.neighbors(s):
+                if b in self.seller_of_b:
+                    value = w_bs - profit_b[b]
+                else:
+                    value = w_bs + eps
+                if value > second_value and self._valid_match(sim, s, b):
+                    if value > best_value:
+                        second_value = max(best_value, second_value)
+                        best_b, best_w, best_value = b, w_bs, value
+                    else:
+                        second_value = value
+            if best_value <= eps:
+                self.price_s[s] = 0
+                continue
+            self.price_s[s] = max(second_value - eps, 0)
+            s_b = self.seller_of_b.get(best_b)
+            if s_b is not None:
+                del self.matching_s[s_b]
+                stale.append(s_b)
+            self.matching_s[s] = best_b
+            self.seller_of_b[best_b] = s
+            profit_b[best_b] = best_w - self.price_s[s]
+
+    def _conduct_scaled_auction(self, sim, node_index, eps):
+        b = node_index
+        while b is not None:
+            s, self.marginal_profit_b[b], second = self._argmax2(b, sim)
+            if self.marginal_profit_b[b] <= 0:
+                break
+            prev_b = self.matching_s.get(s)
+            if prev_b is not None:
+                del self.seller_of_b[prev_b]
+            self.matching_s[s] = b
+            self.seller_of_b[b] = s
+            increment = self.marginal_profit_b[b] - max(second, 0) + eps
+            self.price_s[s] += increment
+            self._profit_b[b] = self.marginal_profit_b[b] - increment
+            b = prev_b
+
+    def _release_seller(self, s, fresh):
+        self.matching_s.pop(s, None)
+        self.price_s.pop(s, None)
+        fresh[s] = None
+
     def probably_critical(self, age):
         return age >= self.guess
 
     def _reset_internals(self):
         self.price_s = defaultdict(float)
         self.matching_s = dict()
+        self.seller_of_b = dict()
         self.marginal_profit_b = defaultdict(float)
 
+    def _valid_sellers(self, b, sim):
+        """(seller, weight) of the sellers b may bid on, in arrival order"""
+        for s, v_bs in sim.neighbors(b):
+            if self._valid_match(sim, s, b):
+                yield s, v_bs
+
+    def _bid_list(self, b, sim):
+        """
+        _valid_sellers of b as (sellers, weights) lists, read once per step:
+        in an auction a buyer bids again every time it is displaced, and
+        only the prices change in between.
+        """
+        bid_list = self._bid_sellers.get(b)
+        if bid_list is None:
+            sellers, weights = [], []
+            for s, v_bs in self._valid_sellers(b, sim):
+                sellers.append(s)
+                weights.append(v_bs)
+            bid_list = self._bid_sellers[b] = (sellers, weights)
+        return bid_list
+
     def _argmax(self, b, sim):
         best_s = -1
         max_profit = -100000
-        for s in sim.seller_nodes:
-            if self._valid_match(sim.G.nodes[s], sim.G.nodes[b]):
-                v_bs = sim.G.edges[(b, s)]['weight']
-                profit = v_bs - self.price_s[s]
-                if profit > max_profit:
-                    max_profit = profit
-                    best_s = s
+        price_s = self.price_s
+        for s, v_bs in zip(*self._bid_list(b, sim)):
+            profit = v_bs - price_s[s]
+            if profit > max_profit:
+                max_profit = profit
+                best_s = s
         return (best_s, max_profit)
 
-    def _valid_match(self, s, b):
-        return s['in_market'] and b['in_market']
\ No newline at end of file
+    def _argmax2(self, b, sim):
+        """
+        Like _argmax, but also returns the second best profit (-100000 if
+        there is none)
+        """
+        best_s = -1
+        max_profit = -100000
+        second_profit = -100000
+        price_s = self.price_s
+        for s, v_bs in zip(*self._bid_list(b, sim)):
+            profit = v_bs - price_s[s]
+            if profit > max_profit:
+                second_profit = max_profit
+                max_profit = profit
+                best_s = s
+            elif profit > second_profit:
+                second_profit = profit
+        return (best_s, max_profit, second_profit)
+
+    def _valid_match(self, sim, s, b):
+        return sim.node_attr(s, 'in_market') and sim.node_attr(b, 'in_market')
+
+
+def ascending_auction(W, eps):
+    """
+    DynamicDeferredAcceptance's ascending auction on a sparse weight matrix
+
+    Rows (buyers) bid in order, each bid takes the stored entry with the
+    highest weight - price (lowest column on ties) if that profit is
+    positive, raises its price by eps and displaces its owner, who bids next.
+    Entries that are not stored are never bid on.
+
+    Input:
+      W   - (buyers, sellers) weights, a scipy.sparse matrix or dense array
+      eps - price increment
+    Output:
+      owner   - (sellers,) row holding each column, -1 if none
+      prices  - (sellers,) final prices
+      profits - (buyers,) profit of each row's last bid (-100000 if it had
+                no entry to bid on)
+
+    Runs kernels.ascending_auction when kernels are enabled.
+    """
+    W = sparse.csr_matrix(W)
+    if not W.has_sorted_indices:
+        W = W.sorted_indices()
+    indptr, indices = W.indptr.astype(np.int64), W.indices.astype(np.int64)
+    data = W.data.astype(float)
+    n_buyers, n_sellers = W.shape
+    if kernels.enabled:
+        return kernels.ascending_auction(indptr, indices, data, n_sellers, eps)
+    owner = np.full(n_sellers, -1)
+    prices = np.zeros(n_sellers)
+    profits = np.full(n_buyers, -100000.0)
+    for i in range(n_buyers):
+        b = i
+        while b >= 0:
+            lo, hi = indptr[b], indptr[b + 1]
+            if lo == hi:
+                break
+            cols = indices[lo:hi]
+            row = data[lo:hi] - prices[cols]
+            k = row.argmax()
+            profit = row[k]
+            profits[b] = profit
+            if profit <= 0:
+                break
+            j = cols[k]
+            b, owner[j] = owner[j], b
+            prices[j] += eps
+    return owner, prices, profits
+
@@ -2,10 +2,11 @@ import sys
 sys.path.append("..")
 from algs.algorithms import OnlineWeightMatchingAlgorithm
 from collections import defaultdict
+import heapq
 
 class Greedy(OnlineWeightMatchingAlgorithm):
     # See algorithm 1.
-    def __init__(self):
+    def __init__(self, use_heaps=True):
         self.p = defaultdict(float)
         # p from the algorithm is something like value
         # self.p is seller_index -> to -> value
@@ -13,6 +14,16 @@ class Greedy(OnlineWeightMatchingAlgorithm):
         # self.m is seller_index -> to -> matched_buyer_index
         self.critical_at = 1
         # needed for batching.
+        self.use_heaps = use_heaps
+        # use per-buyer max-heaps for the argmax instead of scanning all sellers
+        self._heaps = {}
+        # self._heaps is buyer_index -> heap of (-weight, seller_index). Kept
+        # across steps; entries of departed sellers are dropped lazily.
+        self._in_heaps = {}
+        # sellers already pushed to the heaps (dict as ordered set)
+        self._heap_sim = None
+        self._heap_epoch = None
+        # heaps are only valid for this sim and sim.weight_epoch
 
     def compute_matching(self, sim):
         """
@@ -25,6 +36,16 @@ class Greedy(OnlineWeightMatchingAlgorithm):
 
         """
         self._reset_internals()
+        # with top_k candidate lists the scan is over k sellers already, and the
+        # lists change every step, which would mean rebuilding the heaps. With
+        # lazy weights the heaps would hold all B*S weights, the memory the
+        # lazy weight cache bounds, so the scan reads them through the cache.
+        self._heaps_on = (self.use_heaps and getattr(sim, 'top_k', None) is None
+                          and not getattr(sim, 'lazy', False))
+        if self._heaps_on:
+            self._update_heaps(sim)
+        else:
+            self._heaps, self._in_heaps, self._heap_sim = {}, {}, None
         self._process_buyers(sim)
         return self._process_critical_sellers(sim)
 
@@ -33,15 +54,13 @@ class Greedy(OnlineWeightMatchingAlgorithm):
         Go through all buyer nodes in arrival order, matching a buyer to the
         seller with the highest marginal value, if positive.
         """
-        for node_index in range(sim.n + 1):
-            # not iterating over buyers set because order matters
-            if node_index not in sim.G.nodes: continue # node has been removed
-            # assert sim.G.nodes[node_index]['in_market']
-            if node_index in sim.buyer_nodes:
-                s, v_is = self._argmax(node_index, sim)
-                if v_is - self.p[s] > 0:
-                    self.m[s] = node_index
-                    self.p[s] = v_is
+        argmax = self._heap_argmax if self._heaps_on else self._argmax
+        for node_index in sim.buyer_nodes:
+            # buyer_nodes iterates in arrival order, which matters here
+            s, v_is = argmax(node_index, sim)
+            if v_is - self.p[s] > 0:
+                self.m[s] = node_index
+                self.p[s] = v_is
 
 
     def _process_critical_sellers(self, sim):
@@ -55,11 +74,10 @@ class Greedy(OnlineWeightMatchingAlgorithm):
 
         """
         matchings_reversed = {} # buyer : seller
-        for node_index in range(sim.n + 1):
-            # not iterating over sellers set because order matters
-            if node_index in sim.seller_nodes:
-                if sim.is_critical(node_index, self.critical_at) and node_index in self.m:
-                    matchings_reversed[self.m[node_index]] = node_index
+        for node_index in sim.critical_sellers(self.critical_at):
+            # critical_sellers is in arrival order, which matters here
+            if node_index in self.m:
+                matchings_reversed[self.m[node_index]] = node_index
         return [(buyer, seller) for buyer, seller in matchings_reversed.items()]
 
     def _reset_internals(self):
@@ -69,15 +87,63 @@ class Greedy(OnlineWeightMatchingAlgorithm):
     def _argmax(self, b, sim):
         best_s = -1
         max_weight = -100000
-        for s in sim.seller_nodes:
-            if self._valid_match(sim.G.nodes[s], sim.G.nodes[b]):
-                w = sim.G.edges[(b,s)]['weight']
+        for s, w in sim.neighbors(b):
+            if self._valid_match(sim, s, b):
                 if w > max_weight:
                     max_weight = w
                     best_s = s
         return (best_s, max_weight)
 
-    def _valid_match(self, s, b):
-        return s['in_market'] and b['in_market']
+    def _update_heaps(self, sim):
+        """
+        Bring the per-buyer heaps up to date with the market: drop buyers that
+        left, push sellers that entered the market since the last step, and
+        build heaps for new buyers. Departed sellers stay in the heaps until
+        they reach the top (see _heap_argmax).
+        """
+        if sim is not self._heap_sim or sim.weight_epoch != self._heap_epoch:
+            # new sim, reset, or weights recalculated: start over
+            self._heaps = {}
+            self._in_heaps = {}
+            self._heap_sim = sim
+            self._heap_epoch = sim.weight_epoch
+
+        for b in [b for b in self._heaps if b not in sim.buyer_nodes]:
+            del self._heaps[b]
+        self._in_heaps = {s: None for s in self._in_heaps if s in sim.seller_nodes}
+        new_sellers = [
+            s for s in sim.seller_nodes
+            if s not in self._in_heaps and sim.node_attr(s, 'in_market')
+        ]
+
+        for s in new_sellers:
+            for b, w in sim.neighbors(s):
+                if b in self._heaps:
+                    heapq.heappush(self._heaps[b], (-w, s))
+        self._in_heaps.update(dict.fromkeys(new_sellers))
+        for b in sim.buyer_nodes:
+            if b not in self._heaps and sim.node_attr(b, 'in_market'):
+                heap = [(-w, s) for s, w in sim.neighbors(b) if s in self._in_heaps]
+                heapq.heapify(heap)
+                self._heaps[b] = heap
+
+    def _heap_argmax(self, b, sim):
+        """
+        Same result as _argmax, ties included: the heap orders sellers by
+        weight, then by index, i.e. arrival order.
+        """
+        heap = self._heaps.get(b)
+        if heap is None:
+            # buyer not in market yet
+            return (-1, -100000)
+        while heap and heap[0][1] not in sim.seller_nodes:
+            heapq.heappop(heap)
+        if not heap:
+            return (-1, -100000)
+        neg_weight, best_s = heap[0]
+        return (best_s, -neg_weight)
+
+    def _valid_match(self, sim, s, b):
+        return sim.node_attr(s, 'in_market') and sim.node_attr(b, 'in_market')
 
 # Note: not exploring PostponedGreedy because we assume all buyers, sellers predefined
@@ -1,99 +1,128 @@
-from collections import defaultdict
-from algs.algorithms import OnlineWeightMatchingAlgorithm
+from algs.deferred import DynamicDeferredAcceptance
 
-class DeferredWithLookAhead(OnlineWeightMatchingAlgorithm):
+class DeferredWithLookAhead(DynamicDeferredAcceptance):
     # See algorithm 4.
-    def __init__(self, la_thresh):
-        self.price_s = defaultdict(float)
-        # p from the algorithm is something like value
-        # self.price_s is seller_index -> to -> value
-        self.matching_s = dict() # matches (index)
-        # self.matching_s is seller_index -> to -> matched_buyer_index
-        self.marginal_profit_b = defaultdict(float)
-        # self.marginal_profit_b q_b from the algorithm. For each buyer->seller
-        # match made
-        self.eps = 1e-3
-        # for the ascending auction to ensure termination
-        # Algorithmic analysis in the paper was conducted with self.eps -> 0
-        self.critical_at = 1
-        # needed for batching.
+    # Same ascending auction as DynamicDeferredAcceptance, but buyers may also
+    # bid on sellers that have not entered the market yet (see _valid_match).
+    def __init__(self, la_thresh, eps_scaling=False, scaling_factor=4):
+        super().__init__(eps_scaling=eps_scaling, scaling_factor=scaling_factor)
         self.threshold = la_thresh
         # Furthest look-ahead allowed
+        self._activates_at = {}
+        # buyer -> tick it enters the market, for every buyer seen
+        self._eligible_by_k = {}
+        # buyer k -> sellers with k <= threshold and d > that k (0 <= k <= threshold)
+        self._eligible_sorted = {}
+        # buyer k -> its eligible sellers in arrival order, for the current step
+        self._sellers = {}
+        # seller -> None for every seller seen and not gone (dict as ordered set)
+        self._events = {}
+        # tick -> [(seller, buyer k or None)]: the seller joins the sets of
+        # all buyer k < its d (None) or leaves the set of that buyer k
+        self._eligible_sim = None
+        self._eligible_epoch = None
+        self._eligible_t = None
+        self._eligible_n = None
+        # sets are only valid for this sim and sim.weight_epoch (a reset bumps
+        # it), and are up to date with this tick and last node index
 
     def compute_matching(self, sim):
-        """
-        Input:
-          Current state of the market. (from simulator)
-
-        Output:
-          Matching: a list, of (buyer, seller) pairs.
-            buyer and seller are indexes into sim.G for the appropriate node.
+        self._update_eligible(sim)
+        return super().compute_matching(sim)
 
+    def _update_eligible(self, sim):
         """
-        self._reset_internals()
-        self._process_buyers(sim)
-        return self._process_critical_sellers(sim)
+        Brings the eligible sellers of every buyer k up to date with the
+        market, without reading every seller's k and d.
 
-    def _process_buyers(self, sim):
-        """
-        Go through all buyer nodes in arrival order, conducting an ascending
-        auction to create a tentative seller, buyer match.
+        A seller is eligible for buyers with k <= b_k once it is at most
+        threshold steps from entering (tick activates_at - threshold), as
+        long as its d > b_k; once in market its d drops each tick, so it
+        leaves the set of b_k at tick expires_at - b_k. Both ticks are known
+        when the seller is first seen, so they are filed as events, and each
+        step only handles the events of the ticks since the last one, the
+        new nodes, and the sellers that left.
         """
-        for node_index in range(sim.n + 1):
-            # not iterating over buyers set because order matters
-            if node_index not in sim.G.nodes: continue # node has been removed
-            # assert sim.G.nodes[node_index]['in_market']
-            if node_index in sim.buyer_nodes:
-                self._conduct_ascending_auction(sim, node_index)
+        t = sim.t
+        if sim is not self._eligible_sim or sim.weight_epoch != self._eligible_epoch:
+            # new sim, reset or weights recalculated: every node is new
+            self._eligible_sim = sim
+            self._eligible_epoch = sim.weight_epoch
+            self._activates_at = {}
+            self._eligible_by_k = {b_k: set() for b_k in range(self.threshold + 1)}
+            self._sellers = {}
+            self._events = {}
+            self._eligible_t = t - 1
+            new_nodes = list(sim.buyer_nodes) + list(sim.seller_nodes)
+        else:
+            new_nodes = [n for n in range(self._eligible_n + 1, sim.n + 1)
+                         if n in sim.buyer_nodes or n in sim.seller_nodes]
 
-    def _conduct_ascending_auction(self, sim, node_index):
-        terminate = False
-        b = node_index
-        while not terminate:
-            s, self.marginal_profit_b[b] = self._argmax_given_k(b, sim)
-            if self.marginal_profit_b[b] > 0:
-                prev_b = None
-                if s in self.matching_s:
-                    prev_b = self.matching_s[s]
-                self.matching_s[s] = b
-                self.price_s[s] += self.eps
-                b = prev_b
-            terminate = (b is None or self.marginal_profit_b[b] <= 0)
+        gone = [s for s in self._sellers if s not in sim.seller_nodes]
+        for s in gone:
+            del self._sellers[s]
+            for eligible in self._eligible_by_k.values():
+                eligible.discard(s)
+        for b in [b for b in self._activates_at if b not in sim.buyer_nodes]:
+            del self._activates_at[b]
 
-    def _process_critical_sellers(self, sim):
-        """
-        Go through all seller nodes in arrival order, and make a matching for
-        the sellers that are 'critical'
-
-        Output:
-          Matching: a list, of (buyer, seller) pairs.
-            buyer and seller are indexes into sim.G for the appropriate node.
+        for node in new_nodes:
+            activates_at = t + sim.node_attr(node, 'k')
+            if sim.node_attr(node, 'buyer'):
+                self._activates_at[node] = activates_at
+                continue
+            self._sellers[node] = None
+            expires_at = max(t, activates_at) + sim.node_attr(node, 'd')
+            joins = max(activates_at - self.threshold, t)
+            self._events.setdefault(joins, []).append((node, None))
+            for b_k in range(self.threshold + 1):
+                leaves = expires_at - b_k
+                if leaves > joins:
+                    self._events.setdefault(leaves, []).append((node, b_k))
 
-        """
-        matchings_reversed = {} # buyer : seller
-        for node_index in range(sim.n + 1):
-            # not iterating over sellers set because order matters
-            if node_index in sim.seller_nodes:
-                if sim.is_critical(node_index, self.critical_at) and node_index in self.matching_s:
-                    matchings_reversed[self.matching_s[node_index]] = node_index
-        return [(buyer, seller) for buyer, seller in matchings_reversed.items()]
+        # (tick t again if called twice in one tick: nodes may have arrived since)
+        for tick in range(min(self._eligible_t + 1, t), t + 1):
+            for s, b_k in self._events.pop(tick, ()):
+                if s not in self._sellers:
+                    continue
+                if b_k is not None:
+                    self._eligible_by_k[b_k].discard(s)
+                    continue
+                d = sim.node_attr(s, 'd')
+                for k in range(min(d, self.threshold + 1)):
+                    self._eligible_by_k[k].add(s)
+        self._eligible_t = t
+        self._eligible_n = sim.n
+        self._eligible_sorted = {}
 
-    def _reset_internals(self):
-        self.price_s = defaultdict(float)
-        self.matching_s = dict()
-        self.marginal_profit_b = defaultdict(float)
+    def _buyer_k(self, b, sim):
+        """k of buyer b if it is within the look-ahead threshold, else None"""
+        activates_at = self._activates_at.get(b)
+        if activates_at is None:
+            return None
+        b_k = max(activates_at - sim.t, 0)
+        return b_k if b_k <= self.threshold else None
 
-    def _argmax_given_k(self, b, sim):
-        best_s = -1
-        max_profit = -100000
-        for s in sim.seller_nodes:
-            if self._valid_match(sim.G.nodes[s], sim.G.nodes[b]):
-                v_bs = sim.G.edges[(b, s)]['weight']
-                profit = v_bs - self.price_s[s]
-                if profit > max_profit:
-                    max_profit = profit
-                    best_s = s
-        return (best_s, max_profit)
+    def _valid_sellers(self, b, sim):
+        """Eligible sellers of b with an edge to it, in arrival order: the
+        eligible set and b's edges, going through the smaller of the two"""
+        b_k = self._buyer_k(b, sim)
+        if b_k is None:
+            return
+        eligible = self._eligible_by_k[b_k]
+        if 2 * len(eligible) >= len(sim.seller_nodes):
+            # most sellers are eligible: filtering b's edges reads less
+            for s, v_bs in sim.neighbors(b):
+                if s in eligible:
+                    yield s, v_bs
+            return
+        in_order = self._eligible_sorted.get(b_k)
+        if in_order is None:
+            in_order = self._eligible_sorted[b_k] = sorted(eligible)
+        for s in in_order:
+            if sim.has_edge(b, s):
+                yield s, sim.weight(b, s)
 
-    def _valid_match(self, s, b):
-        return b['k'] <= self.threshold and s['k'] <= self.threshold and s['d'] > b['k']
\ No newline at end of file
+    def _valid_match(self, sim, s, b):
+        b_k = self._buyer_k(b, sim)
+        return b_k is not None and s in self._eligible_by_k[b_k]
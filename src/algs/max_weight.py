@@ -0,0 +1,40 @@
+from algs.algorithms import OnlineWeightMatchingAlgorithm
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+class MaxWeightMatching(OnlineWeightMatchingAlgorithm):
+    # Max weight matching of the market as it is now, meant to be wrapped in
+    # BatchingAlgorithm (which sets critical_at to the batch size).
+    def __init__(self):
+        self.matching_s = dict()
+        # self.matching_s is seller_index -> to -> matched_buyer_index
+        self.critical_at = 1
+
+    def compute_matching(self, sim):
+        """
+        Input:
+          Current state of the market. (from simulator)
+
+        Output:
+          Matching: a list, of (buyer, seller) pairs.
+            buyer and seller are indexes into sim.G for the appropriate node.
+            Only pairs whose seller is critical are returned.
+
+        The market is bipartite, so instead of a general (blossom) matching
+        the buyer x seller weight matrix of the nodes in market is handed to
+        scipy's linear_sum_assignment. The matrix comes from sim.snapshot(),
+        which the simulator keeps up to date as nodes come and go, rather
+        than from one weight lookup per pair. Weights are clipped at 0, so
+        pairs the assignment fills in with a non-positive weight are left out.
+        """
+        snap = sim.snapshot()
+        buyers, sellers = snap.buyers.tolist(), snap.sellers.tolist()
+        W = np.maximum(snap.weights.toarray(), 0)
+        rows, cols = linear_sum_assignment(W, maximize=True)
+        self.matching_s = {
+            sellers[j]: buyers[i] for i, j in zip(rows.tolist(), cols.tolist()) if W[i, j] > 0
+        }
+        return [
+            (self.matching_s[s], s) for s in sim.critical_sellers(self.critical_at)
+            if s in self.matching_s
+        ]
@@ -0,0 +1,144 @@
+"""
+Offline benchmark: the max weight matching of a whole run, knowing every
+arrival in advance.
+
+Interface.run records its arrivals in interface.trace, an
+arrivals.ArrivalTrace whose arrival i is node i of the run. A buyer and a seller
+can be matched offline iff both are in the market at some common tick, with
+the weight the simulator gives that edge when the later of the two is added
+(weights that only change with recalc_weights are not modelled).
+
+Only the time-feasible pairs are generated, and the matching is solved with
+SciPy's sparse assignment solver instead of networkx.max_weight_matching, one
+connected component at a time. The cost depends on how often the market
+empties: with about one arrival per tick and short deadlines, 10^5 nodes fall
+into many small components and take a few seconds, but a busier market
+(several arrivals per tick, deadlines around 10 ticks) forms one component of
+about 10^6 edges and takes about 20 s, most of it in the solver.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, min_weight_full_bipartite_matching
+
+from arrivals import ArrivalTrace
+from weights import pairwise_weights
+
+
+def time_feasible_edges(arrivals, weight_func):
+    """Edges of the offline matching problem
+
+    Args:
+        arrivals    : ArrivalTrace (or list of (t, pos, d, buyer, k)), node i is arrival i
+        weight_func : weight function of the simulator used for the run
+
+    Returns:
+        (buyers, sellers, weights) arrays of node indices and positive weights,
+        one entry per buyer-seller pair that shares a tick in the market
+    """
+    if not isinstance(arrivals, ArrivalTrace):
+        arrivals = ArrivalTrace.from_records(arrivals)
+    n = len(arrivals)
+    added_at, pos, d, is_buyer = arrivals.t, arrivals.pos.astype(float), arrivals.d, arrivals.buyer
+    # deadlines.expiry_times, on whole columns
+    activates_at = added_at + np.maximum(arrivals.k, 0)
+    expires_at = activates_at + np.maximum(d, 1)
+
+    # a node can only overlap with nodes added at most `reach` ticks earlier
+    reach = int((expires_at - added_at).max(initial=0))
+    edges_b, edges_s, edges_w = [], [], []
+    for buyer in (True, False):
+        side = is_buyer == buyer
+        earlier = np.flatnonzero(~side)     # the other side, in arrival order
+        starts = np.searchsorted(added_at[earlier], added_at - reach)
+        ends = np.searchsorted(earlier, np.arange(n))
+        for i in np.flatnonzero(side):
+            others = earlier[starts[i]:ends[i]]
+            others = others[(expires_at[others] > activates_at[i])
+                            & (activates_at[others] < expires_at[i])]
+            if len(others) == 0:
+                continue
+            # d of the earlier nodes at the tick node i was added
+            others_d = expires_at[others] - np.maximum(added_at[i], activates_at[others])
+            if buyer:
+                w = pairwise_weights(weight_func, pos[[i]], d[[i]], pos[others], others_d)[0]
+                buyers, sellers = np.full(len(others), i), others
+            else:
+                w = pairwise_weights(weight_func, pos[others], others_d, pos[[i]], d[[i]])[:, 0]
+                buyers, sellers = others, np.full(len(others), i)
+            keep = w > 0
+            edges_b.append(buyers[keep])
+            edges_s.append(sellers[keep])
+            edges_w.append(w[keep])
+
+    if not edges_w:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(edges_b), np.concatenate(edges_s), np.concatenate(edges_w)
+
+
+def offline_max_weight_matching(arrivals, weight_func):
+    """Max weight matching over a full run, as (total weight, [(buyer, seller)])
+
+    The edges are split into connected components, each solved on its own
+    (see _solve_component). Components are small when the market empties
+    every so often; a market that never empties is one component, and the
+    solver's cost then grows faster than linearly with the run length.
+
+    Args:
+        arrivals    : ArrivalTrace (or list of (t, pos, d, buyer, k)), e.g. interface.trace
+        weight_func : weight function of the simulator used for the run
+    """
+    buyers, sellers, w = time_feasible_edges(arrivals, weight_func)
+    if len(w) == 0:
+        return 0.0, []
+    n = len(arrivals)
+    graph = csr_matrix((w, (buyers, sellers)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+
+    order = np.argsort(labels[buyers], kind='stable')
+    bounds = np.flatnonzero(np.diff(labels[buyers][order])) + 1
+    total, matching = 0.0, []
+    for edges in np.split(order, bounds):
+        component_weight, component_matching = _solve_component(
+            buyers[edges], sellers[edges], w[edges])
+        total += component_weight
+        matching.extend(component_matching)
+    return total, sorted(matching)
+
+
+def _solve_component(buyers, sellers, w):
+    """Max weight matching of one component, as a min cost full matching
+
+    One row per buyer, one column per seller plus one dummy column per buyer
+    (staying unmatched). Real edges cost C - w and dummies C, so every full
+    matching of the rows costs (number of buyers) * C - (matched weight).
+    """
+    row_nodes, rows = np.unique(buyers, return_inverse=True)
+    col_nodes, cols = np.unique(sellers, return_inverse=True)
+    num_rows, num_cols = len(row_nodes), len(col_nodes)
+
+    C = w.max() + 1
+    dummies = np.arange(num_rows)
+    cost = csr_matrix(
+        (np.concatenate([C - w, np.full(num_rows, C)]),
+         (np.concatenate([rows, dummies]), np.concatenate([cols, num_cols + dummies]))),
+        shape=(num_rows, num_cols + num_rows))
+    matched_rows, matched_cols = min_weight_full_bipartite_matching(cost)
+
+    real = matched_cols < num_cols
+    matched_rows, matched_cols = matched_rows[real], matched_cols[real]
+    matching = list(zip(row_nodes[matched_rows].tolist(), col_nodes[matched_cols].tolist()))
+    total = float((C - np.asarray(cost[matched_rows, matched_cols]).ravel()).sum())
+    return total, matching
+
+
+def competitive_ratio(weights, arrivals, weight_func):
+    """Weight an online run achieved over the offline optimum of its arrivals
+
+    Args:
+        weights     : list of (weight, step) returned by Interface.run
+        arrivals    : interface.trace from the same run
+        weight_func : weight function of the simulator used for the run
+    """
+    optimum, _ = offline_max_weight_matching(arrivals, weight_func)
+    achieved = sum(weight for weight, _ in weights)
+    return achieved / optimum if optimum > 0 else 1.0
@@ -0,0 +1,52 @@
+import numpy as np
+
+import kernels
+from algs.greedy import Greedy
+
+class VectorizedGreedy(Greedy):
+    # Greedy on sim.snapshot() (see snapshot.py), with the buyer loop done in
+    # NumPy. Gives exactly the matchings of Greedy.
+    def __init__(self):
+        super().__init__(use_heaps=False)
+
+    def _process_buyers(self, sim):
+        """
+        Same result as Greedy._process_buyers, ties included.
+
+        A buyer's argmax does not depend on the prices, so all of them come
+        from one pass over the snapshot's CSR rows (first column with the row
+        maximum = earliest seller). Going through the buyers in arrival order,
+        a seller changes hands only to a buyer with a strictly higher weight,
+        starting from price 0. So each seller ends up with the earliest of the
+        buyers that picked it with the highest weight, if that weight is
+        positive, at a price of that weight.
+        """
+        snap = sim.snapshot()
+        W = snap.weights
+        if W.nnz == 0:
+            return
+        if kernels.enabled:
+            W.sort_indices()
+            picks, bids = kernels.row_argmax(W.indptr, W.indices, W.data)
+            rows = np.flatnonzero(picks >= 0)
+            picks, bids = picks[rows], bids[rows]
+        else:
+            counts = np.diff(W.indptr)
+            rows = np.flatnonzero(counts)
+            row_max = np.maximum.reduceat(W.data, W.indptr[rows])
+            # the entries at the row maximum, and of those the first of each row
+            at_max = np.flatnonzero(W.data == np.repeat(row_max, counts[rows]))
+            entry_row = np.repeat(np.arange(W.shape[0]), counts)[at_max]
+            first = at_max[np.r_[True, entry_row[1:] != entry_row[:-1]]]
+            picks = W.indices[first]
+            bids = W.data[first]
+        # rows are in arrival order, so per seller: highest bid, then earliest row
+        positive = bids > 0
+        rows, picks, bids = rows[positive], picks[positive], bids[positive]
+        order = np.lexsort((rows, -bids, picks))
+        winners = order[np.r_[True, picks[order][1:] != picks[order][:-1]]]
+        for s, b, w in zip(snap.sellers[picks[winners]].tolist(),
+                           snap.buyers[rows[winners]].tolist(),
+                           bids[winners].tolist()):
+            self.m[s] = b
+            self.p[s] = w
@@ -0,0 +1,382 @@
+"""
+Array-backed version of the ride sharing market in simulator.py
+
+Same contract as simulator.Simulator (add_node, remove_matching, advance,
+is_critical, weight, node_attr), but node attributes live in NumPy columns
+and weights in a dense buyer x seller matrix instead of NetworkX dicts.
+"""
+
+import numpy as np
+
+import kernels
+from deadlines import DeadlineQueue, expiry_times
+from snapshot import MarketSnapshot
+from weights import pairwise_weights
+
+
+class _NodeTable:
+    """Column storage for the nodes on one side of the market
+
+    Each live node owns a slot (a row in every column). Slots of removed nodes
+    go on a free-list and are handed out again before the columns grow, so the
+    table only grows when more nodes are alive at once than ever before.
+    """
+
+    columns = ('ids', 'pos', 'activates_at', 'expires_at', 'in_market', 'added_at')
+
+    def __init__(self, capacity):
+        self.ids = np.full(capacity, -1, dtype=np.int64)    # node index, -1 if slot is free
+        self.pos = np.zeros((capacity, 2))
+        self.activates_at = np.zeros(capacity, dtype=np.int64)
+        self.expires_at = np.zeros(capacity, dtype=np.int64)
+        self.in_market = np.zeros(capacity, dtype=bool)
+        self.added_at = np.zeros(capacity, dtype=np.int64)
+        self.free = list(range(capacity - 1, -1, -1))      # pop() gives lowest slot first
+
+    @property
+    def capacity(self):
+        return len(self.ids)
+
+    def grow(self):
+        """Doubles the number of slots"""
+        old = self.capacity
+        for name in self.columns:
+            col = getattr(self, name)
+            bigger = np.zeros((2 * old,) + col.shape[1:], dtype=col.dtype)
+            bigger[:old] = col
+            setattr(self, name, bigger)
+        self.ids[old:] = -1
+        self.free.extend(range(2 * old - 1, old - 1, -1))
+
+    def release(self, slot):
+        self.ids[slot] = -1
+        self.in_market[slot] = False
+        self.free.append(slot)
+
+    def live(self):
+        """Slots currently holding a node"""
+        return np.flatnonzero(self.ids >= 0)
+
+    def d(self, slots, t):
+        """Departure time counters of the nodes in slots at tick t"""
+        return self.expires_at[slots] - np.maximum(t, self.activates_at[slots])
+
+
+class ArraySimulator:
+    """Simulates Ride Sharing Market on NumPy arrays
+
+    Drop-in alternative to simulator.Simulator for large markets. Buyers and
+    sellers each get a _NodeTable; W[buyer_slot, seller_slot] holds the weight
+    of every buyer-seller pair. Node indices (self.n) are the same as the
+    NetworkX version, so algorithms see identical ids. The scalar reads
+    algorithms make in their inner loops (weight, neighbors, node_attr) avoid
+    NumPy scalars: in_market is mirrored in a set, the (nodes, slots) of each
+    side are kept until that side changes, and values come out through
+    ndarray.item / tolist.
+
+    Instance variables:
+        t            : current timestep (starts at 0)
+        n            : index of last added node (starts at -1)
+        W            : buyer slot x seller slot weight matrix
+        weight_epoch : bumped whenever weights read earlier may be stale (reset, recalc)
+        weight_func  : weight function for caluclating edge weights
+        buyer_nodes  : buyer nodes in market, in arrival order
+        seller_nodes : seller nodes in market, in arrival order
+
+    See Simulator for the timer mechanics; they are identical, including the
+    absolute activation / expiry ticks behind d and k.
+    """
+
+    def __init__(self, weight_func, capacity=64):
+        """initializes instance of market
+
+        Args:
+            weight_func (function)    : function specifying how pairwise weights should be calculated
+              * Expected form of weight_func: weight_func(buyer_pos, buyer_d, seller_pos, seller_d)
+            capacity (int)            : initial number of slots per side (grows as needed)
+        """
+        self.t = 0
+        self.n = -1
+        self.weight_epoch = 0
+        self.weight_func = weight_func
+        self.capacity = capacity
+        self.buyer_nodes = {}                 # dicts used as ordered sets, as in Simulator
+        self.seller_nodes = {}
+        self._init_storage()
+
+    def _init_storage(self):
+        self._buyers = _NodeTable(self.capacity)
+        self._sellers = _NodeTable(self.capacity)
+        self.W = np.zeros((self.capacity, self.capacity))
+        self._loc = {}                        # node index -> (table, slot)
+        self._in_market = set()               # nodes in market, mirrors the in_market columns
+        self._side_slots = {}                 # buyer side? -> (nodes, slots array), see _side
+        self._deadlines = DeadlineQueue()
+        self._snapshot = None                 # snapshot() of the current market, if taken
+
+    def reset(self):
+        """
+        Resets everything except for the weight function
+        """
+        self.t = 0
+        self.n = -1
+        self.weight_epoch += 1
+        self.buyer_nodes.clear()
+        self.seller_nodes.clear()
+        self._init_storage()
+
+    def _alloc(self, table):
+        if not table.free:
+            table.grow()
+            grown = np.zeros((self._buyers.capacity, self._sellers.capacity))
+            rows, cols = self.W.shape
+            grown[:rows, :cols] = self.W
+            self.W = grown
+        return table.free.pop()
+
+    def add_node(self, pos, d, buyer, k=0):
+        """Adds node to the market (buyer or seller)
+
+        Args:
+            pos (tup: (dbl, dbl)) : (x,y) position of node
+            d (int)               : number of advances until node exits market (rmvd. on d'th advance)
+            buyer (bool)          : True = buyer, False = seller
+            k (int)               : steps to wait until node added to market
+        """
+        self.n += 1
+        table, other = (self._buyers, self._sellers) if buyer else (self._sellers, self._buyers)
+        slot = self._alloc(table)
+        table.ids[slot] = self.n
+        table.pos[slot] = pos
+        activates_at, expires_at = expiry_times(self.t, d, k)
+        table.activates_at[slot] = activates_at
+        table.expires_at[slot] = expires_at
+        table.in_market[slot] = False if k > 0 else True
+        table.added_at[slot] = self.t
+        self._loc[self.n] = (table, slot)
+        if k <= 0:
+            self._in_market.add(self.n)
+            self._snapshot = None
+        self._side_slots.pop(buyer, None)
+        self._deadlines.push(self.n, activates_at, expires_at, pending=k > 0)
+
+        # Weights to every node on the other side
+        others = other.live()
+        if buyer:
+            self.W[slot, others] = pairwise_weights(
+                self.weight_func, [pos], [d], other.pos[others], other.d(others, self.t))[0]
+            self.buyer_nodes[self.n] = None
+        else:
+            self.W[others, slot] = pairwise_weights(
+                self.weight_func, other.pos[others], other.d(others, self.t), [pos], [d])[:, 0]
+            self.seller_nodes[self.n] = None
+
+    def _remove(self, node_index):
+        table, slot = self._loc.pop(node_index)
+        if node_index in self._in_market:
+            self._in_market.discard(node_index)
+            self._snapshot = None
+        self._side_slots.pop(table is self._buyers, None)
+        self._deadlines.discard(
+            node_index, table.activates_at[slot].item(), table.expires_at[slot].item())
+        table.release(slot)
+        self.buyer_nodes.pop(node_index, None)
+        self.seller_nodes.pop(node_index, None)
+
+    def remove_matching(self, buyer_i, seller_i):
+        """
+        Input:
+          match - (buyer, seller) pair
+          buyer, seller are node indexes
+        Output:
+          weight of the match
+        """
+        b_table, b_slot = self._loc[buyer_i]
+        s_table, s_slot = self._loc[seller_i]
+        assert b_table.in_market[b_slot] and s_table.in_market[s_slot]
+        assert b_table.d(b_slot, self.t) > 0 and s_table.d(s_slot, self.t) > 0
+        weight = float(self.W[b_slot, s_slot])
+        self._remove(buyer_i)
+        self._remove(seller_i)
+        return weight
+
+    def is_critical(self, node_index, critical_at=1):
+        table, slot = self._loc[node_index]
+        return table.d(slot, self.t) == critical_at
+
+    def critical_sellers(self, critical_at=1):
+        """Sellers for which is_critical(seller, critical_at) holds, in arrival order"""
+        if kernels.enabled:
+            # same candidates as below: sellers in the expiry bucket, and the
+            # pending sellers (which keep their full d until they enter)
+            candidates = dict.fromkeys(
+                s for s in self._deadlines.expiring.get(self.t + critical_at, ())
+                if s in self.seller_nodes)
+            candidates.update((s, None) for s in self._deadlines.pending() if s in self.seller_nodes)
+            table = self._sellers
+            slots = np.array([self._loc[s][1] for s in candidates], dtype=np.int64)
+            slots = kernels.critical_slots(slots, table.activates_at, table.expires_at,
+                                           self.t, critical_at)
+            return sorted(table.ids[slots].tolist())
+        critical = [
+            s for s in self._deadlines.expiring.get(self.t + critical_at, ())
+            if s in self.seller_nodes and self.node_attr(s, 'in_market')
+        ]
+        pending = [
+            s for s in self._deadlines.pending()
+            if s in self.seller_nodes and self.node_attr(s, 'd') == critical_at
+        ]
+        return sorted(critical + pending) if pending else critical
+
+    def weight(self, buyer_i, seller_i):
+        """Weight of the edge between buyer_i and seller_i"""
+        return self.W.item(self._loc[buyer_i][1], self._loc[seller_i][1])
+
+    def has_edge(self, buyer_i, seller_i):
+        """Always True: every buyer is connected to every seller"""
+        return True
+
+    def _side(self, buyer):
+        """(buyer or seller nodes in arrival order, their slots), kept until that side changes"""
+        side = self._side_slots.get(buyer)
+        if side is None:
+            nodes = list(self.buyer_nodes if buyer else self.seller_nodes)
+            side = (nodes, np.array([self._loc[node][1] for node in nodes], dtype=np.int64))
+            self._side_slots[buyer] = side
+        return side
+
+    def candidate_changes(self, since=None):
+        """No top_k here, so never any changes (see Simulator.candidate_changes)"""
+        return (None if since is None else []), 0
+
+    def neighbors(self, node_index):
+        """(node, weight) of every node on the other side, in arrival order"""
+        table, slot = self._loc[node_index]
+        buyer = table is self._buyers
+        others, other_slots = self._side(not buyer)
+        weights = self.W[slot, other_slots] if buyer else self.W[other_slots, slot]
+        return zip(others, weights.tolist())
+
+    def weight_submatrix(self, buyers, sellers):
+        """Weights of buyers x sellers as a (len(buyers), len(sellers)) array"""
+        rows = [self._loc[b][1] for b in buyers]
+        cols = [self._loc[s][1] for s in sellers]
+        return self.W[np.ix_(rows, cols)]
+
+    def snapshot(self):
+        """Weights between the buyers and sellers in market as a snapshot.MarketSnapshot
+
+        Every pair has a weight here, so the snapshot is the in-market block
+        of W (see MarketSnapshot.from_dense). It is kept until a node enters
+        or leaves the market or the weights are recalculated.
+        """
+        if self._snapshot is not None:
+            return self._snapshot
+        sides = []
+        for table in (self._buyers, self._sellers):
+            slots = np.flatnonzero(table.in_market)
+            order = np.argsort(table.ids[slots], kind='stable')
+            sides.append((table.ids[slots[order]], slots[order]))
+        (buyers, rows), (sellers, cols) = sides
+        self._snapshot = MarketSnapshot.from_dense(buyers, sellers, self.W[np.ix_(rows, cols)])
+        return self._snapshot
+
+    def node_attr(self, node_index, key):
+        """Reads one attribute (pos, d, k, in_market, added_at, buyer) of a node
+
+        Algorithms call this in their inner loops, so in_market comes from a
+        set and the columns are read with ndarray.item, which returns Python
+        scalars without building NumPy ones.
+        """
+        if key == 'in_market' and node_index in self._in_market:
+            return True
+        table, slot = self._loc[node_index]
+        if key == 'buyer':
+            return table is self._buyers
+        if key == 'pos':
+            return tuple(table.pos[slot].tolist())
+        if key == 'd':
+            return table.expires_at.item(slot) - max(self.t, table.activates_at.item(slot))
+        if key == 'k':
+            return max(table.activates_at.item(slot) - self.t, 0)
+        return getattr(table, key).item(slot)
+
+    def advance(self, recalc_weights=False):
+        """Advances the market by one step in time
+            - Removes nodes in market whose departure time counter hits 0
+            - Adds nodes whose wait time counter hits 0
+            - Recalculates weights (if flag)
+          Only nodes expiring / activating on the new tick are visited.
+
+        Args:
+            recalc_weights (bool): If true, recalculates all weights in graph
+                after counter is decremented. Use if function of dep. times
+
+        Returns:
+            (discarded_buyers, discarded_sellers)
+        """
+        self.t += 1
+
+        discarded_buyers = 0
+        discarded_sellers = 0
+        for node_index in self._deadlines.pop_expiring(self.t):
+            if node_index in self.buyer_nodes:
+                discarded_buyers += 1
+            else:
+                discarded_sellers += 1
+            self._remove(node_index)
+
+        for node_index in self._deadlines.pop_activating(self.t):
+            table, slot = self._loc[node_index]
+            table.in_market[slot] = True
+            self._in_market.add(node_index)
+            self._snapshot = None
+
+        if recalc_weights:
+            self.weight_epoch += 1
+            self._recalc_weights()
+            self._snapshot = None
+        return (discarded_buyers, discarded_sellers)
+
+    def _recalc_weights(self):
+        buyers, sellers = self._buyers.live(), self._sellers.live()
+        self.W[np.ix_(buyers, sellers)] = pairwise_weights(
+            self.weight_func,
+            self._buyers.pos[buyers], self._buyers.d(buyers, self.t),
+            self._sellers.pos[sellers], self._sellers.d(sellers, self.t)
+        )
+
+    # Utility Functions
+    def print_nodes(self):
+        """Prints nodes
+        """
+        in_market, not_in_market = [], []
+        for node_index in sorted(self._loc):
+            attrs = {key: self.node_attr(node_index, key)
+                     for key in ('pos', 'd', 'buyer', 'in_market', 'k', 'added_at')}
+            (in_market if attrs['in_market'] else not_in_market).append((node_index, attrs))
+
+        print("Nodes in market: (total in market + to be added: {})".format(len(self._loc)))
+        for node in in_market:
+            print(node)
+        if len(not_in_market) > 0:
+            print("Nodes not yet in market: ({})".format(len(not_in_market)))
+            for node in not_in_market:
+                print(node)
+
+    def print_edges(self):
+        """Prints edges
+        """
+        print("Edges: ({})".format(len(self.buyer_nodes) * len(self.seller_nodes)))
+        for b in self.buyer_nodes:
+            for s in self.seller_nodes:
+                print(((b, s), {'weight': self.weight(b, s)}))
+
+    def print_all(self):
+        """Prints buyer and sellers, nodes & edges
+        """
+        print("\nTimestep: ", str(self.t))
+        print("Buyers: " + str(list(self.buyer_nodes)))
+        print("Sellers: " + str(list(self.seller_nodes)))
+        self.print_nodes()
+        self.print_edges()
@@ -0,0 +1,98 @@
+"""
+Arrival traces: the nodes a run adds to the market, stored column by column.
+
+Interface.run records the arrivals of every run in interface.trace and can
+replay a trace instead of drawing new arrivals, so one trace can drive any
+number of algorithms (common random numbers):
+
+    inter = Interface(algs.Greedy(), sim, seed=0)
+    inter.run(1000)
+    inter.trace.save("arrivals.npz")
+    for alg in algorithms:
+        Interface(alg, sim).run(1000, trace=ArrivalTrace.load("arrivals.npz"))
+"""
+import numpy as np
+
+
+class ArrivalTrace:
+    """Columnar arrival sequence, sorted by arrival tick
+
+    Node i of a run replaying the trace is arrival i:
+        t     : (n,) tick the node is added at
+        pos   : (n, 2) position
+        d     : (n,) departure time counter
+        k     : (n,) steps until the node enters the market
+        buyer : (n,) True = buyer, False = seller
+    """
+
+    columns = ('t', 'pos', 'd', 'k', 'buyer')
+
+    def __init__(self, t=(), pos=(), d=(), k=None, buyer=()):
+        self.t = np.asarray(t, dtype=np.int64).reshape(-1)
+        n = len(self.t)
+        self.pos = np.asarray(pos).reshape(n, 2)
+        self.d = np.asarray(d, dtype=np.int64).reshape(n)
+        self.k = np.zeros(n, dtype=np.int64) if k is None else np.asarray(k, dtype=np.int64).reshape(n)
+        self.buyer = np.asarray(buyer, dtype=bool).reshape(n)
+        if np.any(np.diff(self.t) < 0):
+            raise ValueError("arrivals must be sorted by tick")
+
+    @classmethod
+    def from_records(cls, records):
+        """Trace of a list of (t, pos, d, buyer, k) tuples"""
+        records = list(records)
+        return cls(
+            t=[r[0] for r in records],
+            pos=[r[1] for r in records],
+            d=[r[2] for r in records],
+            k=[r[4] for r in records],
+            buyer=[r[3] for r in records])
+
+    @classmethod
+    def concatenate(cls, traces):
+        """One trace of the traces one after the other"""
+        traces = list(traces)
+        if not traces:
+            return cls()
+        return cls(*[np.concatenate([getattr(trace, name) for trace in traces])
+                     for name in cls.columns])
+
+    def __len__(self):
+        return len(self.t)
+
+    def __eq__(self, other):
+        return isinstance(other, ArrivalTrace) and all(
+            np.array_equal(getattr(self, name), getattr(other, name)) for name in self.columns)
+
+    def __getitem__(self, i):
+        """Arrival i as a (t, pos, d, buyer, k) tuple"""
+        return (self.t[i].item(), tuple(self.pos[i].tolist()), self.d[i].item(),
+                self.buyer[i].item(), self.k[i].item())
+
+    def records(self):
+        """All arrivals as (t, pos, d, buyer, k) tuples"""
+        return [(t, tuple(pos), d, buyer, k) for t, pos, d, buyer, k in zip(
+            self.t.tolist(), self.pos.tolist(), self.d.tolist(), self.buyer.tolist(), self.k.tolist())]
+
+    def at(self, t):
+        """Trace of the arrivals at tick t"""
+        lo, hi = np.searchsorted(self.t, (t, t + 1))
+        return self._slice(lo, hi)
+
+    def _slice(self, lo, hi):
+        # views of the columns, already checked, so skip __init__
+        part = ArrivalTrace.__new__(ArrivalTrace)
+        for name in self.columns:
+            setattr(part, name, getattr(self, name)[lo:hi])
+        return part
+
+    def save(self, path, compressed=True):
+        """Writes the trace to a .npz file"""
+        save = np.savez_compressed if compressed else np.savez
+        save(path, **{name: getattr(self, name) for name in self.columns})
+
+    @classmethod
+    def load(cls, path):
+        """Reads a trace written by save"""
+        with np.load(path) as data:
+            return cls(*[data[name] for name in cls.columns])
@@ -0,0 +1,217 @@
+"""
+Scaling benchmarks: how fast each algorithm runs as the market grows.
+
+Every case changes the Interface parameters of BASE (arrivals per step,
+deadline distribution, grid size, weight recalculation); the market_* cases
+grow the live market through max_to_add and dep_distr, up to about 1000 live
+nodes. Each case runs every algorithm on both simulator backends (NetworkX
+Simulator and ArraySimulator) with the same seed, except where LIMITS cuts
+the steps or leaves out the algorithms too slow for that market. For each
+run it records steps/sec, the per-step latency percentiles (from
+profiler.Profiler), the peak memory traced by tracemalloc during a second,
+identical run, and the total matched weight (which must not change unless
+an algorithm does).
+
+Run from src/:
+    python benchmarks/scaling.py --output results.json
+    python benchmarks/scaling.py --compare benchmarks/scaling_baseline.json
+    python benchmarks/scaling.py --output benchmarks/scaling_baseline.json   # new baseline
+
+With --compare, the exit status is 1 if any run found a different total
+weight than the baseline or used more memory by more than --tolerance.
+Runs that got slower (steps/sec or p99 latency) by more than --tolerance are
+printed as warnings, since the baseline's timings come from another machine;
+with --check_speed they fail the comparison too.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+import algs
+import array_simulator
+import interface
+import simulator
+import weights
+from profiler import Profiler
+
+ALGORITHMS = {
+    "Greedy": algs.Greedy,
+    "VectorizedGreedy": algs.VectorizedGreedy,
+    "DDA": algs.DynamicDeferredAcceptance,
+    "VectorizedDDA": lambda: algs.DynamicDeferredAcceptance(vectorized=True),
+    "LookAhead3": lambda: algs.DeferredWithLookAhead(3),
+    "BatchingMWM5": lambda: algs.BatchingAlgorithm(algs.MaxWeightMatching(), batch=5),
+}
+
+BACKENDS = {
+    "networkx": simulator.Simulator,
+    "array": array_simulator.ArraySimulator,
+}
+
+BASE = dict(max_to_add=4, dep_distr=(3, 1), size=(10, 10), recalc_weights=False)
+
+CASES = {
+    "base": {},
+    "arrivals_2": dict(max_to_add=2),
+    "arrivals_8": dict(max_to_add=8),
+    "deadline_10": dict(dep_distr=(10, 3)),
+    "deadline_30": dict(dep_distr=(30, 10)),
+    "size_50": dict(size=(50, 50)),
+    "recalc": dict(recalc_weights=True, dep_distr=(10, 3)),
+    "market_250": dict(max_to_add=20, dep_distr=(20, 5)),     # ~250 live nodes
+    "market_1000": dict(max_to_add=40, dep_distr=(50, 10)),   # ~1000 live nodes
+}
+
+# Cases that run fewer steps than --num_steps and / or only some algorithms.
+# The market fills up within ~60 steps; at ~1000 live nodes DDA and LookAhead3
+# take minutes per run on the pair-by-pair simulator API.
+LIMITS = {
+    "market_250": dict(num_steps=100),
+    "market_1000": dict(num_steps=100,
+                        algorithms=("Greedy", "VectorizedGreedy", "VectorizedDDA", "BatchingMWM5")),
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+def run_case(alg_name, case, num_steps, seed, measure_memory=True, backend="networkx"):
+    """Runs one algorithm on one case, returns its benchmark record"""
+    params = dict(BASE, **CASES[case])
+
+    def make_interface(profiler=None):
+        return interface.Interface(
+            ALGORITHMS[alg_name](), BACKENDS[backend](weights.inverse_squared_distance),
+            seed=seed, profiler=profiler, **params)
+
+    profiler = Profiler()
+    inter = make_interface(profiler)
+    A = time.perf_counter()
+    matched = inter.run(num_steps)[0]
+    runtime = time.perf_counter() - A
+    latencies = 1e3 * np.array([row['step_time'] for row in profiler.steps])
+
+    record = {
+        "case": case,
+        "backend": backend,
+        "algorithm": alg_name,
+        "params": {name: list(value) if isinstance(value, tuple) else value
+                   for name, value in params.items()},
+        "num_steps": num_steps,
+        "seed": seed,
+        "total_weight": sum(w for w, step in matched),
+        "num_nodes": len(inter.trace),
+        "peak_market": profiler.peaks['buyers'] + profiler.peaks['sellers'],
+        "steps_per_sec": num_steps / runtime,
+    }
+    for q, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+        record["latency_p{}_ms".format(q)] = value
+
+    if measure_memory:
+        # separate run: tracing allocations slows everything down
+        inter = make_interface()
+        tracemalloc.start()
+        inter.run(num_steps)
+        record["peak_memory_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return record
+
+
+def compare(results, baseline, tolerance, check_speed=False):
+    """
+    Compares results against baseline records.
+
+    The total weight must match whenever the run (steps, seed) does, and the
+    peak memory may grow by at most tolerance. Steps/sec and p99 latency
+    depend on the machine the baseline was recorded on, so a slowdown beyond
+    tolerance is only a warning unless check_speed is set.
+
+    Output:
+      problems - regressions, as printable strings
+      warnings - slowdowns that are not regressions (check_speed off)
+    """
+    def key(r):
+        return r["case"], r.get("backend", "networkx"), r["algorithm"]
+
+    by_key = {key(r): r for r in baseline}
+    problems, warnings = [], []
+    slowdowns = problems if check_speed else warnings
+    for r in results:
+        base = by_key.get(key(r))
+        if base is None:
+            continue
+        name = "/".join(key(r))
+        if (r["num_steps"], r["seed"]) != (base["num_steps"], base["seed"]):
+            problems.append("{}: baseline ran {} steps with seed {}".format(
+                name, base["num_steps"], base["seed"]))
+            continue
+        if not np.isclose(r["total_weight"], base["total_weight"]):
+            problems.append("{}: total weight {:.6f}, baseline {:.6f}".format(
+                name, r["total_weight"], base["total_weight"]))
+        if r["steps_per_sec"] < base["steps_per_sec"] * (1 - tolerance):
+            slowdowns.append("{}: {:.1f} steps/sec, baseline {:.1f}".format(
+                name, r["steps_per_sec"], base["steps_per_sec"]))
+        for metric, found in (("latency_p99_ms", slowdowns), ("peak_memory_kb", problems)):
+            if metric in r and metric in base and r[metric] > base[metric] * (1 + tolerance):
+                found.append("{}: {} {:.3f}, baseline {:.3f}".format(
+                    name, metric, r[metric], base[metric]))
+    return problems, warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--num_steps", type=int, default=300,
+                        help="steps per run (at most the LIMITS num_steps of a case)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument("--no_memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed relative slowdown / memory growth")
+    parser.add_argument("--check_speed", action="store_true",
+                        help="fail on slowdowns too (only against a baseline from this machine)")
+    args = parser.parse_args()
+
+    print("{:<14}{:<10}{:<18}{:>8}{:>12}{:>10}{:>10}{:>10}{:>12}".format(
+        "case", "backend", "algorithm", "market", "steps/sec", "p50 ms", "p90 ms", "p99 ms",
+        "memory kB"))
+    results = []
+    for case in args.cases:
+        limits = LIMITS.get(case, {})
+        num_steps = min(args.num_steps, limits.get("num_steps", args.num_steps))
+        for backend in args.backends:
+            for alg_name in args.algorithms:
+                if alg_name not in limits.get("algorithms", ALGORITHMS):
+                    continue
+                r = run_case(alg_name, case, num_steps, args.seed, not args.no_memory, backend)
+                results.append(r)
+                print("{:<14}{:<10}{:<18}{:>8}{:>12.1f}{:>10.3f}{:>10.3f}{:>10.3f}{:>12}".format(
+                    case, backend, alg_name, r["peak_market"], r["steps_per_sec"],
+                    r["latency_p50_ms"], r["latency_p90_ms"], r["latency_p99_ms"],
+                    "{:.0f}".format(r["peak_memory_kb"]) if "peak_memory_kb" in r else "-"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            problems, warnings = compare(results, json.load(f), args.tolerance, args.check_speed)
+        for warning in warnings:
+            print("SLOWER " + warning)
+        for problem in problems:
+            print("REGRESSION " + problem)
+        print("{} regression(s) against {}".format(len(problems), args.compare))
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Weight lost by only showing algorithms each node's top-k edges (Simulator
+top_k), against the full market, for a range of k.
+
+Every (algorithm, k) pair replays the same arrivals, so the differences come
+from the pruning alone. Run from src/:
+    python benchmarks/topk_weight_loss.py --num_steps 200 --ks 1 2 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import algs
+import interface
+import simulator
+import weights
+
+ALGORITHMS = {
+    "Greedy": algs.Greedy,
+    "DDA": algs.DynamicDeferredAcceptance,
+    "LookAhead3": lambda: algs.DeferredWithLookAhead(3),
+}
+
+
+def total_weight(alg, top_k, trace, num_steps, weight_func):
+    """Total matched weight and runtime of one run on the given arrivals"""
+    sim = simulator.Simulator(weight_func, top_k=top_k)
+    inter = interface.Interface(alg, sim)
+    A = time.time()
+    matched = inter.run(num_steps, trace=trace)[0]
+    return sum(w for w, step in matched), time.time() - A
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--num_steps", type=int, default=200)
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument("--max_to_add", type=int, default=8)
+    parser.add_argument("--d_mean", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    weight_func = weights.inverse_squared_distance
+    # record one arrival sequence, replayed by every run
+    recording = interface.Interface(
+        algs.Greedy(), simulator.Simulator(weight_func), min_to_add=1,
+        max_to_add=args.max_to_add, dep_distr=(args.d_mean, args.d_mean / 3), seed=args.seed)
+    recording.run(args.num_steps)
+    trace = recording.trace
+    print("{} arrivals over {} steps".format(len(trace), args.num_steps))
+
+    print("{:<12}{:>6}{:>14}{:>12}{:>10}{:>10}".format(
+        "algorithm", "k", "weight", "lost (%)", "time (s)", "speedup"))
+    for name in args.algorithms:
+        full, full_time = total_weight(ALGORITHMS[name](), None, trace, args.num_steps, weight_func)
+        print("{:<12}{:>6}{:>14.3f}{:>12.2f}{:>10.2f}{:>10.2f}".format(name, "all", full, 0.0, full_time, 1.0))
+        for k in args.ks:
+            weight, runtime = total_weight(ALGORITHMS[name](), k, trace, args.num_steps, weight_func)
+            lost = 100 * (full - weight) / full if full else 0.0
+            print("{:<12}{:>6}{:>14.3f}{:>12.2f}{:>10.2f}{:>10.2f}".format(
+                name, k, weight, lost, runtime, full_time / runtime))
+
+
+if __name__ == "__main__":
+    main()
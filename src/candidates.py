@@ -0,0 +1,130 @@
+"""
+Top-k candidate lists: every node keeps its k best-weight counterparts, and
+algorithms only look at the pairs on those lists.
+
+A pair (b, s) is a candidate if s is among the k best sellers of b or b is
+among the k best buyers of s, so the candidate graph is symmetric and each
+node has at least min(k, counterparts) candidates. Ties go to the
+counterpart that arrived first, as everywhere else.
+"""
+import bisect
+import heapq
+
+
+class CandidateLists:
+    """Per-node top-k lists and the candidate pairs they make up
+
+    Instance variables:
+        k    : list length
+        top  : node -> [(-weight, other), ...], best first, at most k entries
+        kept : node -> {other: number of top lists (1 or 2) the pair is on}
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.top = {}
+        self.kept = {}
+
+    def clear(self):
+        self.top.clear()
+        self.kept.clear()
+
+    def candidates(self, node):
+        """Candidates of node, in arrival order"""
+        return sorted(self.kept[node])
+
+    def is_candidate(self, a, b):
+        return b in self.kept.get(a, ())
+
+    def add(self, node, edges):
+        """Files a new node
+
+        Args:
+            node (int)         : index of the new node
+            edges (list)       : (other, weight) of all the node's edges
+
+        Returns:
+            list of (a, b) pairs between earlier nodes that stopped being
+            candidates (a's list took the new node and dropped b, and b's
+            list does not hold a)
+        """
+        self.top[node] = heapq.nsmallest(self.k, [(-w, other) for other, w in edges])
+        self.kept[node] = {}
+        for _, other in self.top[node]:
+            self._link(node, other)
+        dropped = []
+        for other, w in edges:
+            top = self.top[other]
+            entry = (-w, node)
+            if len(top) == self.k and entry >= top[-1]:
+                continue
+            bisect.insort(top, entry)
+            self._link(other, node)
+            if len(top) > self.k:
+                _, last = top.pop()
+                if self._unlink(other, last):
+                    dropped.append((other, last))
+        return dropped
+
+    def remove(self, nodes, adj):
+        """Forgets nodes that left, refilling the lists they were on
+
+        Call after the nodes are gone from adj.
+
+        Args:
+            nodes (list) : nodes that left
+            adj (dict)   : other -> {node: {'weight': w}} of the remaining market
+
+        Returns:
+            list of (a, b) pairs between remaining nodes that became
+            candidates (a's list was refilled with b)
+        """
+        gone = set(nodes)
+        affected = set()
+        for node in nodes:
+            for other in self.kept.pop(node, {}):
+                if other in gone:
+                    continue
+                del self.kept[other][node]
+                affected.add(other)
+            del self.top[node]
+        refilled = []
+        for other in sorted(affected):
+            top = [entry for entry in self.top[other] if entry[1] not in gone]
+            self.top[other] = top
+            # the rest of the list only moves up, so refill from what is below it
+            if len(top) < self.k and len(adj[other]) > len(top):
+                on_list = {o for _, o in top}
+                for entry in heapq.nsmallest(self.k - len(top), [
+                        (-attrs['weight'], o) for o, attrs in adj[other].items() if o not in on_list]):
+                    top.append(entry)
+                    if self._link(other, entry[1]):
+                        refilled.append((other, entry[1]))
+        return refilled
+
+    def rebuild(self, adj, nodes):
+        """Builds all lists from scratch (after weights changed)"""
+        self.clear()
+        for node in nodes:
+            self.top[node] = heapq.nsmallest(
+                self.k, [(-attrs['weight'], other) for other, attrs in adj[node].items()])
+            self.kept[node] = {}
+        for node in nodes:
+            for _, other in self.top[node]:
+                self._link(node, other)
+
+    def _link(self, a, b):
+        """Puts the pair on one more list, True if it was on none"""
+        self.kept[a][b] = self.kept[a].get(b, 0) + 1
+        self.kept[b][a] = self.kept[b].get(a, 0) + 1
+        return self.kept[a][b] == 1
+
+    def _unlink(self, a, b):
+        """Takes the pair off one list, True if it is on none now"""
+        for x, y in ((a, b), (b, a)):
+            count = self.kept[x][y] - 1
+            if count:
+                self.kept[x][y] = count
+            else:
+                del self.kept[x][y]
+        return b not in self.kept[a]
@@ -3,11 +3,9 @@ import sys
 sys.path.append("..")
 import algs
 import simulator
+import weights
 
-def weight_function(buyer_pos, buyer_d, seller_pos, seller_d):
-    bx, by = buyer_pos
-    sx, sy = seller_pos
-    return 1.0/((bx-sx)**2 + (by-sy)**2 + 1)
+weight_function = weights.inverse_squared_distance
 
 def simple_test_cases(some_alg, verbose=False):
     A = time.time()
@@ -23,7 +21,7 @@ def simple_test_cases(some_alg, verbose=False):
         #print(crit_match)
         for match in crit_match:
             assert match[0] in sim.buyer_nodes
-            total_value += sim.G[match[0]][match[1]]['weight']
+            total_value += sim.weight(match[0], match[1])
             sim.remove_matching(match[0],match[1])
         sim.advance()
     print(total_value)
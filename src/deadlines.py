@@ -0,0 +1,68 @@
+"""
+Tick-indexed bookkeeping of when nodes enter and leave the market.
+
+Instead of counting every node's d and k down on each advance, the simulators
+store absolute times:
+    activates_at = tick the node enters the market (added_at + k)
+    expires_at   = tick the node is removed (activates_at + d)
+and file each node under those ticks, so advance only touches the nodes whose
+tick has come. d and k are recovered on demand:
+    d = expires_at - max(t, activates_at)
+    k = max(activates_at - t, 0)
+"""
+from collections import defaultdict
+
+
+class DeadlineQueue:
+    """Buckets of node indices keyed by the tick they activate / expire
+
+    Each bucket is a dict used as an ordered set, so nodes come out in the
+    order they were pushed (arrival order) and can be dropped in O(1) when they
+    leave early (e.g. matched).
+    """
+
+    def __init__(self):
+        self.activating = defaultdict(dict)   # tick -> nodes entering the market
+        self.expiring = defaultdict(dict)     # tick -> nodes leaving the market
+
+    def clear(self):
+        self.activating.clear()
+        self.expiring.clear()
+
+    def push(self, node, activates_at, expires_at, pending):
+        """Files a node; pending nodes (k > 0) also wait for activation"""
+        if pending:
+            self.activating[activates_at][node] = None
+        self.expiring[expires_at][node] = None
+
+    def discard(self, node, activates_at, expires_at):
+        """Forgets a node that left before its expiry tick"""
+        for buckets, tick in ((self.activating, activates_at), (self.expiring, expires_at)):
+            bucket = buckets.get(tick)
+            if bucket is not None:
+                bucket.pop(node, None)
+                if not bucket:
+                    del buckets[tick]
+
+    def pending(self):
+        """Nodes still waiting to enter the market"""
+        for bucket in self.activating.values():
+            yield from bucket
+
+    def pop_activating(self, t):
+        """Nodes entering the market at tick t, in arrival order"""
+        return list(self.activating.pop(t, ()))
+
+    def pop_expiring(self, t):
+        """Nodes leaving the market at tick t, in arrival order"""
+        return list(self.expiring.pop(t, ()))
+
+
+def expiry_times(t, d, k):
+    """(activates_at, expires_at) of a node added at tick t with d and k
+
+    A node is removed on the d'th advance after it enters the market; d < 1 is
+    treated as 1 (removed on the next advance), as before.
+    """
+    activates_at = t + max(k, 0)
+    return activates_at, activates_at + max(d, 1)
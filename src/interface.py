@@ -3,9 +3,26 @@ This file serves as the interface between the simulator and the algorithms.
 """
 import numpy as np
 
+from arrivals import ArrivalTrace
+from recorder import ListRecorder
+
 
 class Interface:
     """
+    Arrivals are drawn from the interface's own numpy Generator (self.rng,
+    seeded with seed), never from the global np.random state, in blocks of
+    block_size steps at a time. Each block draws the per-step counts, then
+    positions, deadlines and sides of all its nodes as arrays, and whole blocks
+    are always drawn, so with a given seed step i sees the same arrivals no
+    matter how long the run is or what else runs in the process.
+
+    Every run records its arrivals in self.trace (an arrivals.ArrivalTrace, see
+    also algs.offline), and run(num_steps, trace) replays a recorded trace
+    instead of drawing arrivals.
+
+    With a profiler (profiler.Profiler) set, run times the phases of every
+    step and counts argmax calls and bid chains (see profiler.py).
+
     Use case:
       def conduct_experiments():
           interface = Interface(algorithm, simulator)
@@ -15,6 +32,8 @@ class Interface:
               weights.append(weighting_found)
           plot(weights)
     """
+    block_size = 1024
+
     def __init__(
             self,
             algorithm,
@@ -27,7 +46,8 @@ class Interface:
             dep_distr=(3,1), # to make d constant for all nodes, make variance 0 (duh)
             seed=None,
             verbose=False,
-            recalc_weights=False
+            recalc_weights=False,
+            profiler=None
     ):
         self.max_weight_alg = algorithm
         self.sim = sim
@@ -39,50 +59,104 @@ class Interface:
         self.d_mean = dep_distr[0]
         self.d_var = dep_distr[1]
         self.verbose = verbose
-        if seed:
-            np.random.seed(seed)
-            if self.verbose: print("Random seed set to: ", seed)
+        self.rng = np.random.default_rng(seed)
+        if seed is not None and self.verbose: print("Random seed set to: ", seed)
         self.recalc_weights = recalc_weights
+        self.profiler = profiler
 
-    def run(self, num_steps):
+    def run(self, num_steps, trace=None, recorder=None):
+        """Runs the algorithm on the market for num_steps steps
+
+        Args:
+            num_steps (int)     : number of steps
+            trace (ArrivalTrace): arrivals to replay (arrivals at ticks
+                                  >= num_steps are left out), default: draw new ones
+            recorder            : fresh recorder collecting the results (see
+                                  recorder.py), default: recorder.ListRecorder.
+                                  With a recorder whose keep_trace is False
+                                  (recorder.MetricsRecorder) memory use does not
+                                  grow with num_steps: self.trace is None and
+                                  wait times of departed nodes are dropped.
+
+        Returns:
+            recorder.result(), by default
+            (weights, discarded_buyers, discarded_sellers, matched_wait_times)
+        """
         self.sim.reset()
-        weights = []
-        discarded_buyers = []
-        discarded_sellers = []
-        matched_wait_times = []
-        self.node_original_wait_times = []
+        if recorder is None:
+            recorder = ListRecorder()
+        keep_trace = getattr(recorder, 'keep_trace', True)
+        self.node_original_wait_times = {}   # node index -> d it arrived with
+        recorded = []
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.instrument_run(self.sim, self.max_weight_alg)
+        try:
+            self._run_steps(num_steps, trace, recorder, keep_trace, recorded)
+        finally:
+            if profiler is not None:
+                profiler.restore()
+        self.trace = ArrivalTrace.concatenate(recorded) if keep_trace else None
+        return recorder.result()
 
+    def _run_steps(self, num_steps, trace, recorder, keep_trace, recorded):
+        profiler = self.profiler
         for i in range(num_steps):
-            node_added = self._maybe_add_node(self.min_to_add, self.max_to_add)
+            if profiler is not None:
+                profiler.begin_step(i)
+            if i % self.block_size == 0:
+                if trace is None:
+                    block = self._arrival_block(i)
+                if not keep_trace:
+                    self._forget_departed()
+            arrivals = (block if trace is None else trace).at(i)
+            if keep_trace:
+                recorded.append(arrivals)
+            node_added = self._add_nodes(arrivals)
             if node_added and self.verbose:
                 print("Added ", node_added, " nodes at step ", i)
             matchings = self.max_weight_alg.compute_matching(self.sim)
             for match in matchings:
                 weight = self.sim.remove_matching(match[0], match[1])
-                weights.append((weight, i))
-                matched_wait_times.append(
-                    (self.node_original_wait_times[match[0]],
-                     self.node_original_wait_times[match[1]])
-                )
+                recorder.record_match(
+                    i, weight,
+                    self.node_original_wait_times[match[0]],
+                    self.node_original_wait_times[match[1]])
             removed_b, removed_s = self.sim.advance(self.recalc_weights)
-            discarded_buyers.append((removed_b, i))
-            discarded_sellers.append((removed_s, i))
-        return weights, discarded_buyers, discarded_sellers, matched_wait_times
+            recorder.record_advance(i, removed_b, removed_s)
+            if profiler is not None:
+                profiler.end_step(self.sim)
+
+    def _forget_departed(self):
+        live = self.sim.buyer_nodes.keys() | self.sim.seller_nodes.keys()
+        self.node_original_wait_times = {
+            node: d for node, d in self.node_original_wait_times.items() if node in live}
 
-    def _maybe_add_node(self, min_to_add, max_to_add):
-        if np.random.randint(0,1) > self.p_node: return 0
-        if min_to_add == max_to_add:
-            num_to_add = min_to_add
+    def _arrival_block(self, start):
+        """Draws the arrivals of the block_size steps from tick start on
+
+        Returns:
+            ArrivalTrace of the block
+        """
+        steps = self.block_size
+        if self.min_to_add == self.max_to_add:
+            counts = np.full(steps, self.min_to_add)
         else:
-            num_to_add = np.random.randint(min_to_add, max_to_add)
-        if num_to_add == 0: return 0
-        for i in range(num_to_add):
-            pos_x = round(np.random.uniform(0, self.size[0]))
-            pos_y = round(np.random.uniform(0, self.size[1]))
-            d = max(round(np.random.normal(self.d_mean, self.d_var)), 1)
-            self.node_original_wait_times.append(d)
-            is_buyer = True if np.random.uniform(0,1) <= self.p_buyer else False
-            self.sim.add_node((pos_x, pos_y), d, is_buyer, k=0)
+            counts = self.rng.integers(self.min_to_add, self.max_to_add, size=steps)
+        if 0 > self.p_node:
+            # was `np.random.randint(0,1) > p_node` per step; randint(0,1) is always 0
+            counts[:] = 0
+        n = counts.sum()
+        pos = np.round(self.rng.uniform((0, 0), self.size, size=(n, 2))).astype(int)
+        d = np.maximum(np.round(self.rng.normal(self.d_mean, self.d_var, size=n)), 1).astype(int)
+        is_buyer = self.rng.uniform(0, 1, size=n) <= self.p_buyer
+        t = np.repeat(np.arange(start, start + steps), counts)
+        return ArrivalTrace(t=t, pos=pos, d=d, buyer=is_buyer)
+
+    def _add_nodes(self, arrivals):
+        for t, (pos_x, pos_y), d, is_buyer, k in arrivals.records():
+            self.sim.add_node((pos_x, pos_y), d, is_buyer, k=k)
+            self.node_original_wait_times[self.sim.n] = d
             if self.verbose:
                 print("Node: ({},{}), {}, {}".format(pos_x,pos_y,d,is_buyer))
-        return num_to_add
+        return len(arrivals)
@@ -0,0 +1,108 @@
+"""
+Compiled inner loops for the array-backed code paths, used when Numba is installed.
+
+Each kernel is written as a plain loop over NumPy arrays. With Numba
+importable it is compiled with numba.njit and the callers use it in place of
+their reference (NumPy / Python) path; without Numba the reference paths are
+used and the kernels stay plain Python functions, which the tests still run
+to check them against the reference paths.
+
+    import kernels
+    kernels.enabled          # True when Numba is installed
+    kernels.enabled = False  # run the reference paths (e.g. to compare)
+
+Kernels and their callers:
+    row_argmax        : VectorizedGreedy._process_buyers (per-buyer argmax)
+    ascending_auction : algs.deferred.ascending_auction (the bid chain), run by
+                        DynamicDeferredAcceptance(vectorized=True)
+    critical_slots    : ArraySimulator.critical_sellers (the d check over the
+                        expiry bucket and the pending sellers)
+
+These are the only accelerated paths. The default Greedy,
+DynamicDeferredAcceptance (plain, incremental, eps_scaling) and
+DeferredWithLookAhead read the market pair by pair through the simulator
+API, and Simulator.critical_sellers works on the NetworkX graph and the
+deadline buckets, so none of them use a kernel. To get the compiled loops,
+use VectorizedGreedy / DynamicDeferredAcceptance(vectorized=True), and
+ArraySimulator for critical sellers.
+"""
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAVE_NUMBA = numba is not None
+enabled = HAVE_NUMBA
+
+
+def _compile(func):
+    if numba is None:
+        return func
+    return numba.njit(cache=True)(func)
+
+
+@_compile
+def row_argmax(indptr, indices, data):
+    """First column holding each row's maximum in a CSR matrix
+
+    Input:
+      indptr, indices, data - the CSR arrays, column indices increasing in each row
+    Output:
+      cols   - (rows,) column of the row maximum, -1 for empty rows
+      values - (rows,) the row maximum, 0 for empty rows
+    """
+    n_rows = len(indptr) - 1
+    cols = np.full(n_rows, -1, dtype=np.int64)
+    values = np.zeros(n_rows)
+    for i in range(n_rows):
+        for e in range(indptr[i], indptr[i + 1]):
+            if cols[i] < 0 or data[e] > values[i]:
+                cols[i] = indices[e]
+                values[i] = data[e]
+    return cols, values
+
+
+@_compile
+def ascending_auction(indptr, indices, data, n_sellers, eps):
+    """Same as algs.deferred.ascending_auction, on the CSR arrays (sorted column indices)"""
+    n_buyers = len(indptr) - 1
+    owner = np.full(n_sellers, -1, dtype=np.int64)
+    prices = np.zeros(n_sellers)
+    profits = np.full(n_buyers, -100000.0)
+    for i in range(n_buyers):
+        b = i
+        while b >= 0:
+            if indptr[b] == indptr[b + 1]:
+                break
+            j = indices[indptr[b]]
+            profit = data[indptr[b]] - prices[j]
+            for e in range(indptr[b] + 1, indptr[b + 1]):
+                if data[e] - prices[indices[e]] > profit:
+                    j = indices[e]
+                    profit = data[e] - prices[indices[e]]
+            profits[b] = profit
+            if profit <= 0:
+                break
+            prev = owner[j]
+            owner[j] = b
+            prices[j] += eps
+            b = prev
+    return owner, prices, profits
+
+
+@_compile
+def critical_slots(slots, activates_at, expires_at, t, critical_at):
+    """The slots among slots whose node's d at tick t is critical_at
+
+    d = expires_at - max(t, activates_at), as in deadlines.py.
+    """
+    n = 0
+    found = np.empty(len(slots), dtype=np.int64)
+    for i in range(len(slots)):
+        slot = slots[i]
+        if expires_at[slot] - max(t, activates_at[slot]) == critical_at:
+            found[n] = slot
+            n += 1
+    return found[:n]
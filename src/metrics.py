@@ -0,0 +1,58 @@
+"""
+Aggregate statistics of Interface.run results.
+
+summarize gives the same numbers as make_dataframe in
+experiments/BasicExperiment.ipynb, for one run. summarize_columns computes
+them straight from the match weights and discard counts, without building
+the list with every matched node's weight and a 0 per discarded node that
+make_dataframe takes the standard deviation of.
+"""
+import numpy as np
+
+
+def summarize(weights, discarded_buyers, discarded_sellers):
+    """Aggregates of one run, keyed like the columns of make_dataframe
+
+    Args:
+        weights           : list of (weight, step) returned by Interface.run
+        discarded_buyers  : list of (num_discarded, step) returned by Interface.run
+        discarded_sellers : list of (num_discarded, step) returned by Interface.run
+    """
+    return summarize_columns(
+        [w[0] for w in weights],
+        np.sum([d[0] for d in discarded_buyers]),
+        np.sum([d[0] for d in discarded_sellers]))
+
+
+def summarize_columns(match_weights, num_discarded_buyers, num_discarded_sellers):
+    """Aggregates of one run from its columns, keyed like summarize
+
+    Args:
+        match_weights (array)       : weight of every match
+        num_discarded_buyers (int)  : buyers that left unmatched
+        num_discarded_sellers (int) : sellers that left unmatched
+    """
+    match_weights = np.asarray(match_weights, dtype=float)
+    num_discarded_buyers = int(num_discarded_buyers)
+    num_discarded_sellers = int(num_discarded_sellers)
+    n_matched_nodes = len(match_weights)*2 # because a match is 2 nodes
+    n_discarded = num_discarded_buyers + num_discarded_sellers
+    n_nodes = n_matched_nodes + n_discarded
+
+    avg_weight_matching = match_weights.mean() if len(match_weights) else np.nan
+    avg_weight_per_node = np.nan
+    weight_per_node_stddev = np.nan
+    if n_nodes:
+        # nan without matches, like make_dataframe
+        avg_weight_per_node = (avg_weight_matching * n_matched_nodes) / n_nodes
+        # every matched node counts its match's weight, every discarded node 0
+        mean = avg_weight_per_node if n_matched_nodes else 0.0
+        squares = 2 * np.sum((match_weights - mean)**2) + n_discarded * mean**2
+        weight_per_node_stddev = np.sqrt(squares / n_nodes)
+    return {
+        "avg_weight_matching": avg_weight_matching,
+        "avg_weight_per_node": avg_weight_per_node,
+        "weight_per_node_stddev": weight_per_node_stddev,
+        "num_discarded_sellers": num_discarded_sellers,
+        "num_discarded_buyers": num_discarded_buyers,
+    }
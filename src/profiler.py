@@ -0,0 +1,172 @@
+"""
+Per-phase timing, call counting and market-size gauges for Interface.run.
+
+Nothing here is on the hot path unless a Profiler is handed to the
+Interface: run then wraps the simulator's and the algorithm's methods with
+timing / counting wrappers for the length of the run and takes them off
+afterwards, so the classes themselves never pay for instrumentation.
+
+Use case:
+    profiler = Profiler()
+    inter = Interface(algs.DynamicDeferredAcceptance(), sim, profiler=profiler)
+    inter.run(1000)
+    print(profiler.summary())
+    profiler.save_trace("steps.csv")   # one row per step
+"""
+import csv
+import time
+from collections import defaultdict
+
+# method name -> phase / counter name. Methods an object does not have are skipped.
+SIM_PHASES = {
+    'add_node': 'add_node',
+    'remove_matching': 'remove_matching',
+    'advance': 'advance',
+}
+ALG_PHASES = {
+    'compute_matching': 'compute_matching',
+    '_update_heaps': 'update_heaps',
+    '_process_buyers': 'process_buyers',
+    '_repair_auction': 'process_buyers',
+    '_scaled_auction': 'process_buyers',
+    '_vectorized_auction': 'process_buyers',
+    '_process_critical_sellers': 'process_critical_sellers',
+}
+# bid_chains: one per buyer that starts bidding (with the buyers it displaces
+# in the same chain), not one per bid
+ALG_COUNTERS = {
+    '_argmax': 'argmax',
+    '_argmax2': 'argmax',
+    '_heap_argmax': 'argmax',
+    '_conduct_ascending_auction': 'bid_chains',
+    '_conduct_scaled_auction': 'bid_chains',
+}
+
+
+class Profiler:
+    """Collects phase times, call counts and gauges, per step and in total
+
+    Phases nest: compute_matching includes process_buyers and
+    process_critical_sellers, so phase times do not add up to the run time.
+
+    Instance variables:
+        times    : phase -> seconds over the whole run
+        calls    : phase or counter -> number of calls over the whole run
+        peaks    : gauge -> largest value over the whole run
+        steps    : one dict per step (if keep_steps): step, step_time (whole
+                   step), <phase>_time, <counter>_calls, and the gauges
+                   (buyers, sellers)
+    """
+
+    def __init__(self, keep_steps=True, clock=time.perf_counter):
+        """
+        Args:
+            keep_steps (bool) : keep the per-step rows in self.steps
+            clock (function)  : returns the current time in seconds
+        """
+        self.keep_steps = keep_steps
+        self.clock = clock
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.peaks = defaultdict(int)
+        self.steps = []
+        self._step = None
+        self._step_start = None
+        self._wrapped = []
+
+    def instrument(self, obj, phases=None, counters=None):
+        """Wraps obj's methods until restore()
+
+        Args:
+            obj             : any object (simulator, algorithm)
+            phases (dict)   : method name -> phase name, timed and counted
+            counters (dict) : method name -> counter name, only counted
+        """
+        for names, wrap in ((phases, self._timed), (counters, self._counted)):
+            for method_name, name in (names or {}).items():
+                method = getattr(obj, method_name, None)
+                if method is None:
+                    continue
+                had_own = method_name in vars(obj)
+                self._wrapped.append((obj, method_name, method if had_own else None))
+                setattr(obj, method_name, wrap(name, method))
+
+    def instrument_run(self, sim, algorithm):
+        """Wraps the methods of SIM_PHASES, ALG_PHASES and ALG_COUNTERS"""
+        self.instrument(sim, SIM_PHASES)
+        self.instrument(algorithm, ALG_PHASES, ALG_COUNTERS)
+        inner = getattr(algorithm, 'max_weight_alg', None)
+        if inner is not None:
+            # BatchingAlgorithm runs another algorithm, its compute_matching
+            # is already inside the outer one
+            phases = {name: phase for name, phase in ALG_PHASES.items() if name != 'compute_matching'}
+            self.instrument(inner, phases, ALG_COUNTERS)
+
+    def restore(self):
+        """Takes all wrappers off again"""
+        for obj, method_name, original in reversed(self._wrapped):
+            if original is None:
+                delattr(obj, method_name)
+            else:
+                setattr(obj, method_name, original)
+        self._wrapped = []
+
+    def _timed(self, name, method):
+        clock, times, calls = self.clock, self.times, self.calls
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                times[name] += elapsed
+                calls[name] += 1
+                if self._step is not None:
+                    self._step[name + '_time'] += elapsed
+        return timed
+
+    def _counted(self, name, method):
+        calls = self.calls
+        def counted(*args, **kwargs):
+            calls[name] += 1
+            if self._step is not None:
+                self._step[name + '_calls'] += 1
+            return method(*args, **kwargs)
+        return counted
+
+    def begin_step(self, step):
+        if self.keep_steps:
+            self._step = defaultdict(int)
+            self._step['step'] = step
+            self._step_start = self.clock()
+
+    def end_step(self, sim):
+        self.gauge('buyers', len(sim.buyer_nodes))
+        self.gauge('sellers', len(sim.seller_nodes))
+        if self._step is not None:
+            self._step['step_time'] = self.clock() - self._step_start
+            self.steps.append(dict(self._step))
+            self._step = None
+
+    def gauge(self, name, value):
+        """Records the value of name at the current step (and keeps its peak)"""
+        if self._step is not None:
+            self._step[name] = value
+        self.peaks[name] = max(self.peaks[name], value)
+
+    def summary(self):
+        """Totals: <phase>_time, and <name>_calls / peak_<gauge> for every counter / gauge"""
+        totals = {name + '_time': seconds for name, seconds in self.times.items()}
+        totals.update((name + '_calls', count) for name, count in self.calls.items())
+        totals.update(('peak_' + name, value) for name, value in self.peaks.items())
+        return totals
+
+    def save_trace(self, path):
+        """Writes the per-step rows to a CSV file (missing values left empty)"""
+        columns = ['step']
+        for row in self.steps:
+            columns.extend(name for name in row if name not in columns)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(self.steps)
@@ -0,0 +1,233 @@
+"""
+Collects what happens during Interface.run.
+
+Interface.run reports every match and every advance to a recorder:
+    record_match(step, weight, buyer_wait, seller_wait)
+    record_advance(step, discarded_buyers, discarded_sellers)
+and returns recorder.result(). ListRecorder (the default) gives the lists of
+tuples run has always returned. ResultRecorder keeps the same data in NumPy
+column buffers, optionally flushed to .npy chunks on disk, and summarizes
+them without going through Python lists. MetricsRecorder keeps only running
+aggregates, so its memory use does not depend on the length of the run.
+"""
+import os
+
+import numpy as np
+
+import metrics
+
+
+class ListRecorder:
+    """Results as (weights, discarded_buyers, discarded_sellers, matched_wait_times) lists"""
+
+    def __init__(self):
+        self.weights = []
+        self.discarded_buyers = []
+        self.discarded_sellers = []
+        self.matched_wait_times = []
+
+    def record_match(self, step, weight, buyer_wait, seller_wait):
+        self.weights.append((weight, step))
+        self.matched_wait_times.append((buyer_wait, seller_wait))
+
+    def record_advance(self, step, discarded_buyers, discarded_sellers):
+        self.discarded_buyers.append((discarded_buyers, step))
+        self.discarded_sellers.append((discarded_sellers, step))
+
+    def result(self):
+        return self.weights, self.discarded_buyers, self.discarded_sellers, self.matched_wait_times
+
+
+class _ColumnBuffer:
+    """Append-only NumPy column with amortized O(1) appends (doubling)"""
+
+    def __init__(self, dtype, capacity):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.data):
+            bigger = np.empty(2 * len(self.data), dtype=self.data.dtype)
+            bigger[:self.size] = self.data
+            self.data = bigger
+        self.data[self.size] = value
+        self.size += 1
+
+    def values(self):
+        return self.data[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+
+class ResultRecorder:
+    """Results in NumPy columns
+
+    Two tables:
+        matches  : step, weight, buyer_wait, seller_wait (one row per match)
+        advances : step, discarded_buyers, discarded_sellers (one row per step)
+
+    With chunk_dir set, a table is written to chunk_dir as one .npy file per
+    column ("<table>.<column>.<chunk number>.npy") every time it reaches chunk_size
+    rows, so only the last chunk_size rows stay in memory. column() reads
+    the flushed chunks back memory-mapped.
+
+    Use case:
+        recorder = ResultRecorder(chunk_dir="run_0")
+        interface.run(10**6, recorder=recorder)
+        recorder.summary()
+    """
+
+    tables = {
+        'matches': (('step', np.int64), ('weight', float), ('buyer_wait', np.int64), ('seller_wait', np.int64)),
+        'advances': (('step', np.int64), ('discarded_buyers', np.int64), ('discarded_sellers', np.int64)),
+    }
+
+    def __init__(self, chunk_dir=None, chunk_size=2**20, capacity=1024):
+        """
+        Args:
+            chunk_dir (str)  : directory for flushed chunks (None keeps everything in memory)
+            chunk_size (int) : rows per table kept in memory before a flush
+            capacity (int)   : initial rows per column buffer (grows as needed)
+        """
+        self.chunk_dir = chunk_dir
+        self.chunk_size = chunk_size
+        self.buffers = {
+            name: {column: _ColumnBuffer(dtype, capacity) for column, dtype in columns}
+            for name, columns in self.tables.items()
+        }
+        self.num_chunks = {name: 0 for name in self.tables}
+        if chunk_dir is not None:
+            os.makedirs(chunk_dir, exist_ok=True)
+
+    def record_match(self, step, weight, buyer_wait, seller_wait):
+        self._append('matches', (step, weight, buyer_wait, seller_wait))
+
+    def record_advance(self, step, discarded_buyers, discarded_sellers):
+        self._append('advances', (step, discarded_buyers, discarded_sellers))
+
+    def result(self):
+        self.flush()
+        return self
+
+    def _append(self, table, row):
+        buffers = self.buffers[table]
+        for (column, _), value in zip(self.tables[table], row):
+            buffers[column].append(value)
+        if self.chunk_dir is not None and buffers['step'].size >= self.chunk_size:
+            self._flush_table(table)
+
+    def flush(self):
+        """Writes the rows still in memory to chunk_dir (if set)"""
+        if self.chunk_dir is not None:
+            for table in self.tables:
+                self._flush_table(table)
+
+    def _flush_table(self, table):
+        buffers = self.buffers[table]
+        if buffers['step'].size == 0:
+            return
+        for column, buffer in buffers.items():
+            np.save(self._chunk_path(table, column, self.num_chunks[table]), buffer.values())
+            buffer.clear()
+        self.num_chunks[table] += 1
+
+    def _chunk_path(self, table, column, chunk):
+        return os.path.join(self.chunk_dir, "{}.{}.{:05d}.npy".format(table, column, chunk))
+
+    def column(self, table, column):
+        """All values of one column, flushed chunks included
+
+        Args:
+            table (str)  : 'matches' or 'advances'
+            column (str) : column of that table
+        """
+        chunks = [np.load(self._chunk_path(table, column, chunk), mmap_mode='r')
+                  for chunk in range(self.num_chunks[table])]
+        chunks.append(self.buffers[table][column].values())
+        return np.concatenate(chunks) if len(chunks) > 1 else chunks[0].copy()
+
+    def summary(self):
+        """metrics.summarize aggregates plus discard rates (% of all nodes that left)"""
+        discarded_buyers = self.column('advances', 'discarded_buyers').sum()
+        discarded_sellers = self.column('advances', 'discarded_sellers').sum()
+        aggregates = metrics.summarize_columns(
+            self.column('matches', 'weight'), discarded_buyers, discarded_sellers)
+        n_nodes = 2 * len(self.column('matches', 'step')) + discarded_buyers + discarded_sellers
+        aggregates["pct_discarded_buyers"] = 100 * discarded_buyers / n_nodes if n_nodes else np.nan
+        aggregates["pct_discarded_sellers"] = 100 * discarded_sellers / n_nodes if n_nodes else np.nan
+        return aggregates
+
+
+class MetricsRecorder:
+    """Running aggregates only: the metrics.summarize numbers in O(1) memory
+
+    Match weights go through Welford's update (count, mean, sum of squared
+    deviations) and discards are counted, which is all the per-node
+    statistics need: with m matches of mean weight w_bar and sum of squared
+    deviations M2, and z discarded nodes, the n = 2m + z nodes have
+        mean = 2 m w_bar / n
+        sum of squared deviations = 2 (M2 + m (w_bar - mean)^2) + z mean^2
+
+    Optionally also counts the wait times (d on arrival) of matched buyers and
+    sellers in fixed bins. Waits outside the bins go to the first / last bin.
+
+    result() returns the metrics.summarize dict. The interface keeps no trace
+    with this recorder (keep_trace is False).
+    """
+
+    keep_trace = False
+
+    def __init__(self, wait_bins=None):
+        """
+        Args:
+            wait_bins (sequence) : increasing bin edges for the wait time
+                                   histograms, as for np.histogram (None: no histograms)
+        """
+        self.num_matches = 0
+        self.mean_weight = 0.0
+        self.m2_weight = 0.0
+        self.num_discarded_buyers = 0
+        self.num_discarded_sellers = 0
+        self.wait_bins = None if wait_bins is None else np.asarray(wait_bins)
+        if self.wait_bins is not None:
+            self.buyer_wait_hist = np.zeros(len(self.wait_bins) - 1, dtype=np.int64)
+            self.seller_wait_hist = np.zeros(len(self.wait_bins) - 1, dtype=np.int64)
+
+    def record_match(self, step, weight, buyer_wait, seller_wait):
+        self.num_matches += 1
+        delta = weight - self.mean_weight
+        self.mean_weight += delta / self.num_matches
+        self.m2_weight += delta * (weight - self.mean_weight)
+        if self.wait_bins is not None:
+            self.buyer_wait_hist[self._wait_bin(buyer_wait)] += 1
+            self.seller_wait_hist[self._wait_bin(seller_wait)] += 1
+
+    def _wait_bin(self, wait):
+        # last bin closed on the right, as in np.histogram
+        i = np.searchsorted(self.wait_bins, wait, side='right') - 1
+        return min(max(i, 0), len(self.wait_bins) - 2)
+
+    def record_advance(self, step, discarded_buyers, discarded_sellers):
+        self.num_discarded_buyers += discarded_buyers
+        self.num_discarded_sellers += discarded_sellers
+
+    def result(self):
+        m = self.num_matches
+        n_discarded = self.num_discarded_buyers + self.num_discarded_sellers
+        n_nodes = 2 * m + n_discarded
+        avg_weight_matching = self.mean_weight if m else np.nan
+        avg_weight_per_node = np.nan
+        weight_per_node_stddev = np.nan
+        if n_nodes:
+            avg_weight_per_node = (avg_weight_matching * 2 * m) / n_nodes
+            mean = avg_weight_per_node if m else 0.0
+            squares = 2 * (self.m2_weight + m * (self.mean_weight - mean)**2) + n_discarded * mean**2
+            weight_per_node_stddev = np.sqrt(squares / n_nodes)
+        return {
+            "avg_weight_matching": avg_weight_matching,
+            "avg_weight_per_node": avg_weight_per_node,
+            "weight_per_node_stddev": weight_per_node_stddev,
+            "num_discarded_sellers": self.num_discarded_sellers,
+            "num_discarded_buyers": self.num_discarded_buyers,
+        }
@@ -1,4 +1,4 @@
-from tests import test_sim, test_algs, test_interface
+from tests import test_sim, test_algs, test_interface, test_recorder, test_runner
 
 if __name__ == "__main__":
     print("Testing simulator")
@@ -9,3 +9,12 @@ if __name__ == "__main__":
 
     print("\nTesting interface")
     test_interface.test_interface()
+    test_interface.test_reproducible_arrivals()
+    test_interface.test_trace_replay()
+    test_interface.test_profiler()
+
+    print("\nTesting result recorder")
+    test_recorder.main()
+
+    print("\nTesting experiment runner")
+    test_runner.main()
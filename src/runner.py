@@ -0,0 +1,113 @@
+"""
+Runs grids of experiments (algorithm x Interface parameters x seed) on a
+process pool.
+
+Use case:
+    tasks = experiment_grid(
+        [("Greedy", algs.Greedy), ("LookAhead3", partial(algs.DeferredWithLookAhead, 3))],
+        [dict(weight_func=weights.inverse_squared_distance, num_steps=1000, p_node=0.9)],
+        seeds=range(50))
+    for row in run_experiments(tasks, results_path="results.csv"):
+        print(row["algorithm"], row["seed"], row["avg_weight_per_node"])
+
+Each task builds its own simulator, algorithm and Interface inside the worker,
+and the Interface draws its arrivals from its own RNG seeded with the task's
+seed, so tasks share no state and can run in any process and in any order.
+Algorithm factories and weight functions are sent to the workers by
+pickling, so they must be importable (classes, module level functions,
+functools.partial), not lambdas.
+"""
+import csv
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import interface
+import recorder
+import simulator
+
+_COLUMNS = ["algorithm", "seed", "weight_func", "num_steps", "backend",
+            "avg_weight_matching", "avg_weight_per_node", "weight_per_node_stddev",
+            "num_discarded_sellers", "num_discarded_buyers", "runtime"]
+
+ExperimentTask = namedtuple("ExperimentTask", ["alg_name", "alg_factory", "params", "seed"])
+# params: keyword arguments of Interface, plus
+#   weight_func (required), num_steps (default 1000), backend (default "networkx")
+
+
+def experiment_grid(algorithms, param_sets, seeds):
+    """Every combination of algorithm, parameter set and seed
+
+    Args:
+        algorithms (list): (name, factory) pairs, factory() gives a fresh algorithm
+        param_sets (list): dicts of task parameters (see ExperimentTask)
+        seeds (iterable) : seeds, one run per seed
+    """
+    return [
+        ExperimentTask(alg_name, alg_factory, params, seed)
+        for params in param_sets
+        for seed in seeds
+        for alg_name, alg_factory in algorithms
+    ]
+
+
+def run_task(task):
+    """Runs one task, returns its row of the results table"""
+    params = dict(task.params)
+    weight_func = params.pop("weight_func")
+    num_steps = params.pop("num_steps", 1000)
+    backend = params.pop("backend", "networkx")
+    params.pop("seed", None)
+
+    inter = interface.Interface(
+        task.alg_factory(), simulator.make_simulator(weight_func, backend),
+        seed=task.seed, **params)
+    A = time.time()
+    aggregates = inter.run(num_steps, recorder=recorder.MetricsRecorder())
+    runtime = time.time() - A
+
+    row = {"algorithm": task.alg_name, "seed": task.seed,
+           "weight_func": weight_func.__name__, "num_steps": num_steps, "backend": backend}
+    row.update(params)
+    row.update(aggregates)
+    row["runtime"] = runtime
+    return row
+
+
+def run_experiments(tasks, max_workers=None, results_path=None):
+    """Runs tasks on a process pool, yielding result rows as they finish
+
+    Rows come back in completion order, not task order. If results_path is
+    given, every row is also written to that CSV file as soon as it arrives.
+
+    Args:
+        tasks (list)       : ExperimentTasks, e.g. from experiment_grid
+        max_workers (int)  : pool size (default: number of cores),
+                             0 runs the tasks one by one in this process
+        results_path (str) : CSV file for the results table
+    """
+    tasks = list(tasks)
+    if max_workers == 0:
+        rows = (run_task(task) for task in tasks)
+        yield from _write_rows(rows, results_path, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_task, task) for task in tasks]
+        rows = (future.result() for future in as_completed(futures))
+        yield from _write_rows(rows, results_path, tasks)
+
+
+def _write_rows(rows, results_path, tasks):
+    if results_path is None:
+        yield from rows
+        return
+    # Interface parameters can differ between tasks, so every row gets a
+    # column for every parameter used anywhere in the grid
+    params = sorted({key for task in tasks for key in task.params} - set(_COLUMNS) - {"seed"})
+    with open(results_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=_COLUMNS[:5] + params + _COLUMNS[5:])
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            f.flush()
+            yield row
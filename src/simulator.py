@@ -5,6 +5,15 @@ Last Modified: Nov 15, 2018
 """
 
 import networkx as nx
+import numpy as np
+
+from array_simulator import ArraySimulator
+from candidates import CandidateLists
+from deadlines import DeadlineQueue, expiry_times
+from snapshot import SnapshotBuilder
+from spatial import GridIndex
+from weight_cache import WeightCache
+from weights import pairwise_weights
 
 """
 ************************************************************************
@@ -29,14 +38,35 @@ class Simulator:
     - Nodes are either buyers or sellers
     - weights are calculated between the nodes as a function of position and
       departure time of both nodes
+    - every buyer has an edge to every seller, unless radius is set: then
+      only pairs at distance <= radius get an edge (found through a grid
+      index, see spatial.py), and algorithms must only use the edges that
+      exist (neighbors, has_edge)
+    - with lazy set, no edges are stored: a weight is computed the first
+      time it is read, with the d both nodes had when the eager version
+      would have computed it, and kept in a bounded LRU cache
+      (weight_cache.py), so memory grows with cache_size instead of B*S
+    - with top_k set, algorithms only see each node's k best edges (and the
+      edges on which it is one of the other node's k best), kept up to date
+      as nodes come and go (see candidates.py). weight still gives the
+      weight of any pair with an edge. Pairs between earlier nodes that stop
+      or start being candidates because of an arrival / departure are
+      listed by candidate_changes, so state built on them can be repaired.
+    - if weight_func declares a separable form but no vectorized one (see
+      weights.py) and neither lazy nor top_k is set, each edge also keeps
+      its static part. advance(recalc_weights=True) then only computes the
+      factors of the nodes in the market and combines them with the static
+      parts of all edges in one vectorized pass.
 
     Instance variables:
         t              : current timestep (starts at 0)
         n              : index of last added node (starts at -1)
         G              : graph containing state of market (access this for running algorithms)
+        weight_epoch   : bumped whenever weights or edges read earlier may be stale
+                         (reset, recalc; see candidate_changes for top_k lists)
         weight_func : weight function for caluclating edge weights
-        buyer_nodes : list of buyer nodes in market
-        seller_nodes: list of seller noes in market
+        buyer_nodes : buyer nodes in market, in arrival order
+        seller_nodes: seller nodes in market, in arrival order
 
     Functions:
         __init__ : initializes
@@ -44,6 +74,13 @@ class Simulator:
         add_node : adds a node to the graph with a given position & departure time
         remove_matching: remove a (buyer, seller) pair
         is_critical: return true if a node index is going critical (departure time 0)
+        critical_sellers: sellers going critical, in arrival order
+        candidate_changes: top_k candidate pairs that changed since an earlier call
+        weight   : weight of a (buyer, seller) edge
+        has_edge : whether a (buyer, seller) edge exists
+        neighbors: (node, weight) of every edge of a node, in arrival order
+        snapshot : in-market weights as a sparse matrix (see snapshot.py)
+        node_attr: read one attribute of a node (pos, d, k, in_market, added_at, buyer)
         advance  : advances the market forward one step in time
         print_all: see what's going on (nodes, edges, who is buying, who is selling, etc)
      ** Refer to individual function documentation for more information **
@@ -75,22 +112,65 @@ class Simulator:
         - advance() # Removes x from market
         - time 4: x no longer in market
 
+    d and k are not stored as counters: each node keeps the absolute ticks it
+    enters (activates_at) and leaves (expires_at) the market, and advance only
+    visits the nodes filed under the new tick (see deadlines.py). Read d and k
+    through node_attr.
+
     See test_sim.py for usage examples
     """
 
-    def __init__(self, weight_func):
+    def __init__(self, weight_func, radius=None, top_k=None, lazy=False, cache_size=2**16):
         """initializes instance of market
 
         Args:
             weight_func (function)    : function specifying how pairwise weights should be calculated
               * Expected form of weight_func: weight_func(buyer_pos, buyer_d, seller_pos, seller_d)
+              * May carry a bulk form in weight_func.vectorized and a
+                separable form in weight_func.separable (see weights.py)
+            radius (float)            : only connect buyers and sellers at most this far
+                                        apart (None: connect all pairs)
+            top_k (int)               : only show algorithms each node's top_k best
+                                        edges (None: all edges)
+            lazy (bool)               : compute weights when read instead of storing edges
+            cache_size (int)          : number of weights the lazy cache holds
         """
         self.t = 0                            # time step
         self.n = -1                             # index of last added node
         self.G = nx.Graph()                    # graph
+        self.weight_epoch = 0                # see class docstring
         self.weight_func = weight_func        # weight function
-        self.buyer_nodes = set()            # list of buyer nodes
-        self.seller_nodes = set()            # list of seller nodes
+        # dicts used as ordered sets: iteration is arrival order (node index order)
+        self.buyer_nodes = {}                # buyer nodes
+        self.seller_nodes = {}               # seller nodes
+        self._deadlines = DeadlineQueue()    # nodes by activation / expiry tick
+        self.radius = radius
+        if radius is not None:
+            if radius <= 0:
+                raise ValueError("radius must be positive, got {}".format(radius))
+            # buyers and sellers by position, for finding nodes within radius
+            self._grids = {True: GridIndex(radius), False: GridIndex(radius)}
+        self.top_k = top_k
+        if top_k is not None:
+            self._candidates = CandidateLists(top_k)
+        # (buyer, seller, became candidate?) changes, numbered from _changes_start;
+        # kept from the start of the previous tick on (see candidate_changes)
+        self._changes = []
+        self._changes_start = 0
+        self._tick_start = 0
+        self._snapshots = None               # SnapshotBuilder, from the first snapshot() on
+        self.lazy = lazy
+        self.weight_cache = None
+        if lazy:
+            if radius is not None or top_k is not None:
+                raise ValueError("lazy weights cannot be combined with radius or top_k")
+            self.weight_cache = WeightCache(cache_size)
+        self._weights_at = 0                 # tick the weights were last recalculated at
+        self._separable = None
+        if not lazy and top_k is None and getattr(weight_func, 'vectorized', None) is None:
+            # the one-call vectorized recalculation is at least as fast
+            self._separable = getattr(weight_func, 'separable', None)
+        self._snapshots_epoch = None
 
     def reset(self):
         """
@@ -98,9 +178,23 @@ class Simulator:
         """
         self.t = 0
         self.n = -1
+        self.weight_epoch += 1
         self.G.clear()
         self.buyer_nodes.clear()
         self.seller_nodes.clear()
+        self._deadlines.clear()
+        if self.radius is not None:
+            for grid in self._grids.values():
+                grid.clear()
+        if self.top_k is not None:
+            self._candidates.clear()
+        self._changes_start += len(self._changes)
+        self._tick_start = self._changes_start
+        self._changes = []
+        self._snapshots = None
+        if self.lazy:
+            self.weight_cache.clear()
+        self._weights_at = 0
 
     def add_node(self, pos, d, buyer, k=0):
         """Adds node to the market (buyer or seller)
@@ -118,31 +212,48 @@ class Simulator:
         # Flags node if not yet present (in future state of market), but still adds edges
         in_market = False if k > 0 else True
 
-        # Add node n and add edges to all other nodes based on weight_fun
-        self.G.add_node(self.n, pos=pos, d=d, buyer=buyer, in_market=in_market, k=k, added_at=self.t)
-        nodes_to_connect = self.seller_nodes if buyer else self.buyer_nodes
-
-        for node in nodes_to_connect:
-            node_pos = self.G.nodes[node]['pos']
-            node_d = self.G.nodes[node]['d']
-            buyer_pos, buyer_d   = (pos, d) if buyer else (node_pos, node_d)
-            seller_pos, seller_d = (node_pos, node_d) if buyer else (pos, d)
-            self.G.add_edge(
-                self.n,
-                node,
-                weight=self.weight_func(
-                    buyer_pos=buyer_pos,
-                    buyer_d=buyer_d,
-                    seller_pos=seller_pos,
-                    seller_d=seller_d
+        # Add node n and (unless lazy) edges to all other nodes based on weight_fun
+        activates_at, expires_at = expiry_times(self.t, d, k)
+        self.G.add_node(self.n, pos=pos, buyer=buyer, in_market=in_market, added_at=self.t,
+                        activates_at=activates_at, expires_at=expires_at)
+        self._deadlines.push(self.n, activates_at, expires_at, pending=not in_market)
+        if not self.lazy:
+            if self.radius is None:
+                nodes_to_connect = list(self.seller_nodes if buyer else self.buyer_nodes)
+            else:
+                nodes_to_connect = self._grids[not buyer].within(pos, self.radius)
+                self._grids[buyer].insert(self.n, pos)
+            node_pos = [self.G.nodes[node]['pos'] for node in nodes_to_connect]
+            node_d = [self.node_attr(node, 'd') for node in nodes_to_connect]
+            if buyer:
+                weights = pairwise_weights(self.weight_func, [pos], [d], node_pos, node_d)[0]
+            else:
+                weights = pairwise_weights(self.weight_func, node_pos, node_d, [pos], [d])[:, 0]
+            weights = weights.tolist()
+            if self._separable is None:
+                self.G.add_weighted_edges_from(zip(
+                    [self.n] * len(nodes_to_connect), nodes_to_connect, weights
+                ))
+            else:
+                if buyer:
+                    static = self._separable.static_weights([pos], node_pos)[0]
+                else:
+                    static = self._separable.static_weights(node_pos, [pos])[:, 0]
+                self.G.add_edges_from(
+                    (self.n, node, {'weight': w, 'static': st})
+                    for node, w, st in zip(nodes_to_connect, weights, static.tolist())
                 )
-            )
+            if self.top_k is not None:
+                dropped = self._candidates.add(self.n, list(zip(nodes_to_connect, weights)))
+                self._log_changes(dropped, False)
 
         # Keep track if new node is buyer or seller
         if buyer:
-            self.buyer_nodes.add(self.n)
+            self.buyer_nodes[self.n] = None
         else:
-            self.seller_nodes.add(self.n)
+            self.seller_nodes[self.n] = None
+        if self._snapshots is not None and in_market:
+            self._snapshots.enter(self.n, buyer, self.neighbors(self.n))
 
     def remove_matching(self, buyer_i, seller_i):
         """
@@ -153,25 +264,206 @@ class Simulator:
           weight of the match
         """
         assert self.G.nodes[buyer_i]['in_market'] and self.G.nodes[seller_i]['in_market']
-        assert self.G.nodes[buyer_i]['d'] > 0 and self.G.nodes[seller_i]['d'] > 0
-        self.buyer_nodes.discard(buyer_i)
-        self.seller_nodes.discard(seller_i)
-
-        weight = self.G.edges[buyer_i,seller_i]["weight"]
-        self.G.remove_nodes_from([buyer_i, seller_i])
+        assert self.node_attr(buyer_i, 'd') > 0 and self.node_attr(seller_i, 'd') > 0
+        self.buyer_nodes.pop(buyer_i, None)
+        self.seller_nodes.pop(seller_i, None)
+        for node in (buyer_i, seller_i):
+            attrs = self.G.nodes[node]
+            self._deadlines.discard(node, attrs['activates_at'], attrs['expires_at'])
+
+        weight = self.weight(buyer_i, seller_i)
+        self._remove_nodes([buyer_i, seller_i])
         return weight
 
     def is_critical(self, node_index, critical_at=1):
         # critical_at used for batching.
-        return self.G.nodes[node_index]['d'] == critical_at
+        return self.node_attr(node_index, 'd') == critical_at
+
+    def critical_sellers(self, critical_at=1):
+        """Sellers for which is_critical(seller, critical_at) holds, in arrival order
+
+        Sellers in market are found through the expiry bucket of tick
+        t + critical_at, so this does not scan the market.
+        """
+        critical = [
+            s for s in self._deadlines.expiring.get(self.t + critical_at, ())
+            if s in self.seller_nodes and self.G.nodes[s]['in_market']
+        ]
+        # Sellers yet to enter the market keep their full d until they do
+        pending = [
+            s for s in self._deadlines.pending()
+            if s in self.seller_nodes and self.node_attr(s, 'd') == critical_at
+        ]
+        return sorted(critical + pending) if pending else critical
+
+    def _remove_nodes(self, nodes):
+        if self._snapshots is not None:
+            for node in nodes:
+                self._snapshots.leave(node, self.G.nodes[node]['buyer'])
+        if self.radius is not None:
+            for node in nodes:
+                self._grids[self.G.nodes[node]['buyer']].discard(node)
+        self.G.remove_nodes_from(nodes)
+        if self.top_k is not None:
+            self._log_changes(self._candidates.remove(nodes, self.G._adj), True)
+
+    def _log_changes(self, pairs, added):
+        """Records candidate pairs that changed, and updates the snapshot"""
+        for a, b in pairs:
+            buyer, seller = (a, b) if self.G._node[a]['buyer'] else (b, a)
+            self._changes.append((buyer, seller, added))
+            if self._snapshots is not None:
+                weight = self.G._adj[buyer][seller]['weight']
+                if added:
+                    self._snapshots.link(buyer, seller, weight)
+                else:
+                    self._snapshots.unlink(buyer, seller, weight)
+
+    def candidate_changes(self, since=None):
+        """Candidate pairs (top_k) that changed since an earlier call
+
+        Arrivals drop pairs from earlier nodes' lists and departures refill
+        them. The pairs involving the arriving / departing node itself are
+        not listed (they come and go with the node).
+
+        Args:
+            since (int) : the number an earlier call returned (None: no changes wanted)
+        Returns:
+            (changes, number to pass next time), changes being a list of
+            (buyer, seller, True if it became a candidate / False if it
+            stopped being one), or None if since is None or older than the
+            start of the previous tick (the changes are no longer kept)
+        """
+        end = self._changes_start + len(self._changes)
+        if since is None or since < self._changes_start:
+            return None, end
+        return self._changes[since - self._changes_start:], end
+
+    def weight(self, buyer_i, seller_i):
+        """Weight of the edge between buyer_i and seller_i"""
+        if self.lazy:
+            return self._lazy_weights(buyer_i, [seller_i])[0]
+        return self.G._adj[buyer_i][seller_i]['weight']
+
+    def _lazy_weights(self, node_index, others):
+        """Weights between node_index and others (all on the other side), through the cache
+
+        A pair's weight uses both nodes' d at tick T, the later of the two
+        arrivals and the last recalculation: that is when add_node or
+        advance(recalc_weights=True) would have computed it.
+        """
+        cache, epoch = self.weight_cache, self.weight_epoch
+        nodes = self.G.nodes
+        buyer = nodes[node_index]['buyer']
+        keys = [(node_index, o, epoch) if buyer else (o, node_index, epoch) for o in others]
+        weights = [cache.get(key) for key in keys]
+        misses = [j for j, w in enumerate(weights) if w is None]
+        if not misses:
+            return weights
+        attrs = nodes[node_index]
+        start = max(attrs['added_at'], self._weights_at)
+        by_tick = {}
+        for j in misses:
+            by_tick.setdefault(max(start, nodes[others[j]]['added_at']), []).append(j)
+        for T, group in by_tick.items():
+            pos = [attrs['pos']]
+            d = [attrs['expires_at'] - max(T, attrs['activates_at'])]
+            other_pos = [nodes[others[j]]['pos'] for j in group]
+            other_d = [nodes[others[j]]['expires_at'] - max(T, nodes[others[j]]['activates_at'])
+                       for j in group]
+            if buyer:
+                row = pairwise_weights(self.weight_func, pos, d, other_pos, other_d)[0]
+            else:
+                row = pairwise_weights(self.weight_func, other_pos, other_d, pos, d)[:, 0]
+            for j, w in zip(group, row.tolist()):
+                weights[j] = w
+                cache.put(keys[j], w)
+        return weights
+
+    def has_edge(self, buyer_i, seller_i):
+        """Whether buyer_i and seller_i are connected (always, unless radius or top_k is set)"""
+        if self.lazy:
+            return True
+        if self.top_k is not None:
+            return self._candidates.is_candidate(buyer_i, seller_i)
+        return seller_i in self.G._adj[buyer_i]
+
+    def neighbors(self, node_index):
+        """(node, weight) of every node node_index has an edge to, in arrival order
+
+        Edges to earlier nodes are added with the node, in arrival order, and
+        edges to later nodes are appended as those arrive, so the adjacency
+        dict is already in arrival order. With top_k, only the candidate
+        edges of the node.
+        """
+        if self.top_k is not None:
+            adj = self.G._adj[node_index]
+            for other in self._candidates.candidates(node_index):
+                yield other, adj[other]['weight']
+            return
+        if self.lazy:
+            others = list(self.seller_nodes if self.G.nodes[node_index]['buyer'] else self.buyer_nodes)
+            yield from zip(others, self._lazy_weights(node_index, others))
+            return
+        for other, attrs in self.G._adj[node_index].items():
+            yield other, attrs['weight']
+
+    def weight_submatrix(self, buyers, sellers):
+        """Weights of buyers x sellers as a (len(buyers), len(sellers)) array
+
+        Pairs without an edge (or not candidates, with top_k) get weight 0.
+        """
+        if self.lazy:
+            return np.array([self._lazy_weights(b, sellers) for b in buyers]).reshape(
+                len(buyers), len(sellers))
+        adj = self.G._adj   # plain dicts, skips the views of G.adj
+        W = np.zeros((len(buyers), len(sellers)))
+        for i, b in enumerate(buyers):
+            row = adj[b]
+            if self.top_k is not None:
+                kept = self._candidates.kept[b]
+                W[i] = [row[s]['weight'] if s in kept else 0.0 for s in sellers]
+            elif self.radius is None:
+                W[i] = [row[s]['weight'] for s in sellers]
+            else:
+                W[i] = [row[s]['weight'] if s in row else 0.0 for s in sellers]
+        return W
+
+    def snapshot(self):
+        """Weights between the buyers and sellers in market as a snapshot.MarketSnapshot
+
+        The first call builds the matrix from the graph; after that the
+        snapshot is kept up to date as nodes enter and leave the market, until
+        weight_epoch changes.
+        """
+        if self._snapshots is None or self._snapshots_epoch != self.weight_epoch:
+            self._snapshots = SnapshotBuilder()
+            self._snapshots_epoch = self.weight_epoch
+            # sellers first, so every edge is read once, from its buyer
+            nodes = self.G._node
+            for node in self.seller_nodes:
+                if nodes[node]['in_market']:
+                    self._snapshots.enter(node, False, ())
+            for node in self.buyer_nodes:
+                if nodes[node]['in_market']:
+                    self._snapshots.enter(node, True, self.neighbors(node))
+        return self._snapshots.snapshot()
+
+    def node_attr(self, node_index, key):
+        """Reads one attribute (pos, d, k, in_market, added_at, buyer) of a node"""
+        attrs = self.G.nodes[node_index]
+        if key == 'd':
+            return attrs['expires_at'] - max(self.t, attrs['activates_at'])
+        if key == 'k':
+            return max(attrs['activates_at'] - self.t, 0)
+        return attrs[key]
 
     def advance(self, recalc_weights=False):
         """Advances the market by one step in time
-            - Decrements departure time counter of all nodes in market
-                - Removes nodes where departure_time(node) = 0
-            - Decrements wait time counter of all nodes yet to be added
-                - Adds nodes where wait_time(node) = 0
+            - Removes nodes in market whose departure time counter hits 0
+            - Adds nodes whose wait time counter hits 0
             - Recalculates weights (if flag)
+          Only nodes expiring / activating on the new tick are visited.
 
         Args:
             recalc_weights (bool): If true, recalculates all weights in graph
@@ -182,54 +474,68 @@ class Simulator:
 
         # Increment time counter
         self.t += 1
-
-        # Update deadlines of all nodes (in market + to be added)
-        nodes_to_remove = []
-        for node in self.G.nodes.items():
-            # Nodes in market:
-            #  - decrements dep. timer
-            #  - tags nodes for removal when departure timer equals 0
-            if node[1]['in_market']:
-                dep_time = node[1]['d']
-                if dep_time > 1:
-                    node[1]['d'] -=1
-                else:
-                    nodes_to_remove.append(node[0])
-                    if node[0] in self.buyer_nodes:
-                        discarded_buyers += 1
-                    if node[0] in self.seller_nodes:
-                        discarded_sellers += 1
-                    self.buyer_nodes.discard(node[0])
-                    self.seller_nodes.discard(node[0])
-
-            # Nodes not yet in market:
-            #  - decrements wait timer
-            #  - add to market when wait timer equals 0
-            else:
-                node[1]['k'] -= 1
-                if node[1]['k'] < 1:
-                    node[1]['in_market'] = True
-
-        # Removes nodes
-        self.G.remove_nodes_from(nodes_to_remove)
-
-        # Recalc weights if flagged
-        #  Iterates over buyers' edges; buyers are not connected to other buyers
-        if recalc_weights:
-            for buyer in self.buyer_nodes:
-                buyer_pos = self.G.nodes[buyer]['pos']
-                buyer_d   = self.G.nodes[buyer]['d']
-                for seller in self.G.neighbors(buyer):
-                    seller_pos = self.G.nodes[seller]['pos']
-                    seller_d   = self.G.nodes[seller]['d']
-                    new_weight = self.weight_func(
-                        buyer_pos=buyer_pos,
-                        buyer_d=buyer_d,
-                        seller_pos=seller_pos,
-                        seller_d=seller_d
-                    )
-                    self.G[buyer][seller]['weight'] = new_weight
-                    # TODO -- djp42 -- should this be self.G.edges?
+        # candidate changes from before the last tick are no longer needed
+        del self._changes[:self._tick_start - self._changes_start]
+        self._changes_start = self._tick_start
+        self._tick_start = self._changes_start + len(self._changes)
+
+        # Nodes in market whose departure timer ran out
+        nodes_to_remove = self._deadlines.pop_expiring(self.t)
+        for node in nodes_to_remove:
+            if node in self.buyer_nodes:
+                discarded_buyers += 1
+            if node in self.seller_nodes:
+                discarded_sellers += 1
+            self.buyer_nodes.pop(node, None)
+            self.seller_nodes.pop(node, None)
+        self._remove_nodes(nodes_to_remove)
+
+        # Nodes whose wait timer ran out enter the market
+        for node in self._deadlines.pop_activating(self.t):
+            self.G.nodes[node]['in_market'] = True
+            if self._snapshots is not None:
+                self._snapshots.enter(node, self.G.nodes[node]['buyer'], self.neighbors(node))
+
+        # Recalc weights if flagged (only of the edges that exist)
+        if recalc_weights and self.lazy:
+            # weights are computed as they are read: only forget the old ones
+            self.weight_epoch += 1
+            self._weights_at = self.t
+            self.weight_cache.clear()
+        elif recalc_weights and self._separable is not None:
+            # only the factors change: combine them with every edge's static part at once
+            self.weight_epoch += 1
+            buyers, sellers = list(self.buyer_nodes), list(self.seller_nodes)
+            buyer_factors = self._separable.factors([self.node_attr(b, 'd') for b in buyers], True)
+            seller_factors = self._separable.factors([self.node_attr(s, 'd') for s in sellers], False)
+            column = {seller: j for j, seller in enumerate(sellers)}
+            edges, rows, columns = [], [], []
+            for i, buyer in enumerate(buyers):
+                row = self.G._adj[buyer]
+                edges.extend(row.values())
+                rows.extend([i] * len(row))
+                columns.extend([column[seller] for seller in row])
+            new_weights = self._separable.combine(
+                np.array([attrs['static'] for attrs in edges]),
+                buyer_factors[rows], seller_factors[columns]).tolist()
+            for attrs, w in zip(edges, new_weights):
+                attrs['weight'] = w
+        elif recalc_weights:
+            self.weight_epoch += 1
+            buyers, sellers = list(self.buyer_nodes), list(self.seller_nodes)
+            new_weights = pairwise_weights(
+                self.weight_func,
+                [self.G.nodes[buyer]['pos'] for buyer in buyers],
+                [self.node_attr(buyer, 'd') for buyer in buyers],
+                [self.G.nodes[seller]['pos'] for seller in sellers],
+                [self.node_attr(seller, 'd') for seller in sellers]
+            ).tolist()
+            column = {seller: j for j, seller in enumerate(sellers)}
+            for buyer, row in zip(buyers, new_weights):
+                for seller, attrs in self.G._adj[buyer].items():
+                    attrs['weight'] = row[column[seller]]
+            if self.top_k is not None:
+                self._candidates.rebuild(self.G._adj, list(self.G))
         return (discarded_buyers, discarded_sellers)
 
     # Utility Functions
@@ -241,11 +547,12 @@ class Simulator:
         print("Nodes in market: (total in market + to be added: {})".format(
             len(self.G.nodes)
         ))
-        for node in self.G.nodes.items():
-            if node[1]['in_market']:
-                print(node)
+        for node in self.G.nodes:
+            attrs = dict(self.G.nodes[node], d=self.node_attr(node, 'd'), k=self.node_attr(node, 'k'))
+            if attrs['in_market']:
+                print((node, attrs))
             else:
-                not_in_market.append(node)
+                not_in_market.append((node, attrs))
 
         if len(not_in_market) > 0:
             print("Nodes not yet in market: ({})".format(len(not_in_market)))
@@ -277,12 +584,26 @@ class Simulator:
         """Prints buyer and sellers, nodes & edges
         """
         print("\nTimestep: ", str(self.t))
-        print("Buyers: " + str(self.buyer_nodes))
-        print("Sellers: " + str(self.seller_nodes))
+        print("Buyers: " + str(list(self.buyer_nodes)))
+        print("Sellers: " + str(list(self.seller_nodes)))
         self.print_nodes()
         self.print_edges()
 
 
+def make_simulator(weight_func, backend="networkx", **kwargs):
+    """Builds a market simulator with the requested storage backend
+
+    Args:
+        weight_func (function) : see Simulator.__init__
+        backend (str)          : "networkx" (Simulator) or "array" (ArraySimulator)
+        kwargs                 : passed on to the backend (e.g. capacity for "array")
+    """
+    backends = {"networkx": Simulator, "array": ArraySimulator}
+    if backend not in backends:
+        raise ValueError("Unknown simulator backend: {}".format(backend))
+    return backends[backend](weight_func, **kwargs)
+
+
 # ****************************************************************
 # Needs: (DONE)
 # ****************************************************************
@@ -0,0 +1,193 @@
+"""
+Sparse matrix view of the market for vectorized algorithm kernels.
+
+sim.snapshot() gives a MarketSnapshot: the weights between the buyers and
+sellers currently in the market as a SciPy CSR matrix, rows and columns in
+arrival order, so ties broken toward the lowest column are broken toward the
+earliest seller, as everywhere else:
+
+    snap = sim.snapshot()
+    best = snap.weights.argmax(axis=1)         # per row (buyer), column of best seller
+    s = snap.sellers[best[snap.buyer_row[b]]]  # back to node ids
+
+Only pairs with an edge (see Simulator radius / top_k) and a nonzero weight
+are stored. Simulator keeps a SnapshotBuilder that is told about nodes
+entering and leaving the market, so each edge is read from the graph once,
+when its second endpoint enters the market, rather than on every snapshot.
+"""
+import numpy as np
+from scipy import sparse
+
+
+class MarketSnapshot:
+    """In-market weights at one tick
+
+    Instance variables:
+        buyers     : (B,) node id of every row, increasing
+        sellers    : (S,) node id of every column, increasing
+        weights    : (B, S) scipy.sparse.csr_matrix of weights
+        buyer_row  : node id -> row
+        seller_col : node id -> column
+    """
+
+    def __init__(self, buyers, sellers, weights):
+        self.buyers = buyers
+        self.sellers = sellers
+        self.weights = weights
+        self.buyer_row = {b: i for i, b in enumerate(buyers.tolist())}
+        self.seller_col = {s: j for j, s in enumerate(sellers.tolist())}
+
+    @classmethod
+    def from_dense(cls, buyers, sellers, W):
+        """Snapshot of a dense (B, S) weight array
+
+        The CSR arrays of a full matrix are written directly (every row
+        holds every column) and the zeros dropped afterwards, which is much
+        cheaper than having SciPy scan W for its nonzeros.
+        """
+        n_buyers, n_sellers = W.shape
+        weights = sparse.csr_matrix(
+            (np.array(W, dtype=float).ravel(), np.tile(np.arange(n_sellers), n_buyers),
+             np.arange(n_buyers + 1) * n_sellers),
+            shape=(n_buyers, n_sellers))
+        weights.eliminate_zeros()
+        return cls(np.asarray(buyers, dtype=np.int64), np.asarray(sellers, dtype=np.int64), weights)
+
+
+class _Growable:
+    """NumPy array with amortized O(1) appends"""
+
+    def __init__(self, dtype, capacity=64):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        n = self.size + len(values)
+        if n > len(self.data):
+            bigger = np.empty(max(n, 2 * len(self.data)), dtype=self.data.dtype)
+            bigger[:self.size] = self.data[:self.size]
+            self.data = bigger
+        self.data[self.size:n] = values
+        self.size = n
+
+    def values(self):
+        return self.data[:self.size]
+
+    def reset(self, values):
+        self.size = 0
+        self.extend(values)
+
+
+class _Side:
+    """Slots of the nodes of one side that entered the market"""
+
+    def __init__(self):
+        self.nodes = _Growable(np.int64)    # slot -> node id
+        self.alive = _Growable(bool)        # slot -> still in market
+        self.slot_of = {}                   # node id -> slot, nodes in market only
+
+    def enter(self, node):
+        self.slot_of[node] = self.nodes.size
+        self.nodes.extend([node])
+        self.alive.extend([True])
+
+    def leave(self, node):
+        slot = self.slot_of.pop(node, None)
+        if slot is not None:
+            self.alive.data[slot] = False
+
+    def order(self):
+        """(node ids in arrival order, slot -> index in that order or -1)"""
+        slots = np.flatnonzero(self.alive.values())
+        nodes = self.nodes.values()[slots]
+        by_arrival = np.argsort(nodes, kind='stable')
+        index = np.full(self.nodes.size, -1, dtype=np.int64)
+        index[slots[by_arrival]] = np.arange(len(slots))
+        return nodes[by_arrival], index
+
+    def compact(self, nodes):
+        """Renumbers the slots to the arrival order of the nodes in market"""
+        self.nodes.reset(nodes)
+        self.alive.reset(np.ones(len(nodes), dtype=bool))
+        self.slot_of = {node: i for i, node in enumerate(nodes.tolist())}
+
+
+class SnapshotBuilder:
+    """Edges of the in-market nodes as COO entries, kept up to date as nodes come and go
+
+    Nodes get a slot when they enter the market and their edges to the nodes
+    already in it are appended (row slot, column slot, weight). Leaving only
+    marks the slot dead; dead entries are dropped when building a snapshot,
+    and the entry lists are compacted once they are mostly dead.
+    """
+
+    def __init__(self):
+        self.sides = {True: _Side(), False: _Side()}
+        self.rows = _Growable(np.int64)
+        self.cols = _Growable(np.int64)
+        self.data = _Growable(float)
+        self._snapshot = None
+
+    def enter(self, node, buyer, neighbors):
+        """node entered the market; neighbors: its (other node, weight) edges"""
+        side, other = self.sides[buyer], self.sides[not buyer]
+        side.enter(node)
+        # two flat lists rather than a list of pairs: tuples that stay alive
+        # set off the garbage collector, which then walks the whole graph
+        slot_of = other.slot_of
+        other_slots, weights = [], []
+        for o, w in neighbors:
+            slot = slot_of.get(o)
+            if slot is not None:
+                other_slots.append(slot)
+                weights.append(w)
+        if other_slots:
+            own_slots = [side.slot_of[node]] * len(other_slots)
+            self.rows.extend(own_slots if buyer else other_slots)
+            self.cols.extend(other_slots if buyer else own_slots)
+            self.data.extend(weights)
+        self._snapshot = None
+
+    def link(self, buyer, seller, weight):
+        """The edge between two nodes became visible (see Simulator top_k)"""
+        self._change(buyer, seller, weight)
+
+    def unlink(self, buyer, seller, weight):
+        """The edge between two nodes, with the weight it entered with, is no longer visible"""
+        self._change(buyer, seller, -weight)
+
+    def _change(self, buyer, seller, weight):
+        # entries are summed into the matrix, and a weight minus itself is an
+        # exact 0, dropped by eliminate_zeros
+        row = self.sides[True].slot_of.get(buyer)
+        col = self.sides[False].slot_of.get(seller)
+        if row is not None and col is not None:
+            self.rows.extend([row])
+            self.cols.extend([col])
+            self.data.extend([weight])
+            self._snapshot = None
+
+    def leave(self, node, buyer):
+        """node left the market (matched, expired)"""
+        self.sides[buyer].leave(node)
+        self._snapshot = None
+
+    def snapshot(self):
+        if self._snapshot is not None:
+            return self._snapshot
+        buyers, row_index = self.sides[True].order()
+        sellers, col_index = self.sides[False].order()
+        rows = row_index[self.rows.values()]
+        cols = col_index[self.cols.values()]
+        keep = (rows >= 0) & (cols >= 0)
+        rows, cols, data = rows[keep], cols[keep], self.data.values()[keep]
+        if 2 * len(data) < self.data.size:
+            self.sides[True].compact(buyers)
+            self.sides[False].compact(sellers)
+            self.rows.reset(rows)
+            self.cols.reset(cols)
+            self.data.reset(data)
+        weights = sparse.csr_matrix((data, (rows, cols)), shape=(len(buyers), len(sellers)))
+        weights.eliminate_zeros()
+        self._snapshot = MarketSnapshot(buyers, sellers, weights)
+        return self._snapshot
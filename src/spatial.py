@@ -0,0 +1,61 @@
+"""
+Uniform grid over node positions, for finding the nodes near a point
+without looking at every node.
+"""
+import math
+from collections import defaultdict
+
+
+class GridIndex:
+    """Nodes bucketed by the square cell of side cell_size their position is in
+
+    A radius query only visits the cells overlapping the query disk's
+    bounding box, so with cell_size equal to the radius that is 9 cells
+    however large the market is.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(dict)   # (i, j) -> {node: pos}
+        self._cell_of = {}               # node -> (i, j)
+
+    def _cell(self, pos):
+        return (math.floor(pos[0] / self.cell_size), math.floor(pos[1] / self.cell_size))
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def clear(self):
+        self.cells.clear()
+        self._cell_of.clear()
+
+    def insert(self, node, pos):
+        cell = self._cell(pos)
+        self.cells[cell][node] = pos
+        self._cell_of[node] = cell
+
+    def discard(self, node):
+        cell = self._cell_of.pop(node, None)
+        if cell is not None:
+            bucket = self.cells[cell]
+            del bucket[node]
+            if not bucket:
+                del self.cells[cell]
+
+    def within(self, pos, radius):
+        """Nodes at distance <= radius from pos, in increasing node order"""
+        x, y = pos
+        lo_i, lo_j = self._cell((x - radius, y - radius))
+        hi_i, hi_j = self._cell((x + radius, y + radius))
+        r2 = radius * radius
+        found = []
+        for i in range(lo_i, hi_i + 1):
+            for j in range(lo_j, hi_j + 1):
+                bucket = self.cells.get((i, j))
+                if bucket is None:
+                    continue
+                for node, (ox, oy) in bucket.items():
+                    if (ox - x)**2 + (oy - y)**2 <= r2:
+                        found.append(node)
+        found.sort()
+        return found
@@ -3,8 +3,15 @@ import sys
 sys.path.append("..")
 sys.path.append("../algs/")
 
+import networkx as nx
+import numpy as np
+
 import algs
+import interface
+import kernels
 import simulator
+import weights
+from algs.deferred import ascending_auction
 
 def test_abstract():
     A = time.time()
@@ -17,14 +24,11 @@ def test_abstract():
     raise ValueError(
         "Algorithm Abstract Class initializes but should raise a NotImplementedError.")
 
-def weight_function(buyer_pos, buyer_d, seller_pos, seller_d):
-    bx, by = buyer_pos
-    sx, sy = seller_pos
-    return 1.0/((bx-sx)**2 + (by-sy)**2 + 1)
+weight_function = weights.inverse_squared_distance
 
-def simple_test_cases(some_alg, verbose=False):
+def simple_test_cases(some_alg, verbose=False, backend="networkx"):
     A = time.time()
-    sim = simulator.Simulator(weight_function)
+    sim = simulator.make_simulator(weight_function, backend)
     sim.add_node(pos=(0,0), d=2, buyer=True)
     sim.add_node(pos=(1,1), d=2, buyer=False)
     assert [] == some_alg.compute_matching(sim)
@@ -35,7 +39,7 @@ def simple_test_cases(some_alg, verbose=False):
         print("  1. First test completed in {} sec.".format(B - A))
         A = B
     # reverse order
-    sim = simulator.Simulator(weight_function)
+    sim = simulator.make_simulator(weight_function, backend)
     sim.add_node(pos=(0,0), d=2, buyer=False)
     sim.add_node(pos=(1,1), d=2, buyer=True)
     assert [] == some_alg.compute_matching(sim)
@@ -46,7 +50,7 @@ def simple_test_cases(some_alg, verbose=False):
         print("  2. Reverse simple test completed in {} sec.".format(B - A))
         A = B
     # test only add one
-    sim = simulator.Simulator(weight_function)
+    sim = simulator.make_simulator(weight_function, backend)
     sim.add_node(pos=(0,0), d=1, buyer=False)
     sim.add_node(pos=(0,0), d=1, buyer=True)
     sim.add_node(pos=(1,1), d=1, buyer=True)
@@ -56,7 +60,7 @@ def simple_test_cases(some_alg, verbose=False):
         print("  3. Choose only one match test completed in {} sec.".format(B - A))
         A = B
     # test two matchings
-    sim = simulator.Simulator(weight_function)
+    sim = simulator.make_simulator(weight_function, backend)
     sim.add_node(pos=(0,0), d=1, buyer=False)
     sim.add_node(pos=(0,0), d=1, buyer=True)
     sim.add_node(pos=(1,1), d=1, buyer=True)
@@ -67,7 +71,7 @@ def simple_test_cases(some_alg, verbose=False):
         print("  4. Two matchings test completed in {} sec.".format(B - A))
         A = B
     # test two matchings, where a third node is best and shows up at end
-    sim = simulator.Simulator(weight_function)
+    sim = simulator.make_simulator(weight_function, backend)
     sim.add_node(pos=(0,0), d=2, buyer=False)
     sim.add_node(pos=(0,0), d=2, buyer=True)
     sim.add_node(pos=(1,1), d=2, buyer=True)
@@ -81,7 +85,7 @@ def simple_test_cases(some_alg, verbose=False):
         print("  5. Only choose two test completed in {} sec.".format(B - A))
         A = B
     # test two matchings, third is best, but a new buyer
-    sim = simulator.Simulator(weight_function)
+    sim = simulator.make_simulator(weight_function, backend)
     sim.add_node(pos=(0,0), d=2, buyer=False)
     sim.add_node(pos=(0,0), d=2, buyer=True)
     sim.add_node(pos=(1,1), d=2, buyer=True)
@@ -104,6 +108,7 @@ def test_greedy():
 def test_dfa():
     A = time.time()
     simple_test_cases(algs.DynamicDeferredAcceptance(), verbose = True)
+    simple_test_cases(algs.DynamicDeferredAcceptance(incremental=True))
     print(
         "DynamicDeferredAcceptance tests completed successfully in {} sec".format(
             time.time() - A)
@@ -133,11 +138,434 @@ def test_batching():
             time.time() - A)
     )
 
+def add_random_nodes(sim, rng, max_to_add=4, max_k=0):
+    for _ in range(rng.randint(0, max_to_add + 1)):
+        sim.add_node(
+            pos=(int(rng.randint(0, 5)), int(rng.randint(0, 5))),
+            d=int(rng.randint(1, 6)),
+            buyer=bool(rng.rand() < 0.5),
+            k=int(rng.randint(0, max_k + 1)))
+
+def test_greedy_heaps():
+    # heap argmax must give exactly the matchings of the linear scan, ties included
+    A = time.time()
+    for backend in ("networkx", "array"):
+        for recalc in (False, True):
+            rng = np.random.RandomState(3)
+            sim = simulator.make_simulator(weights.squared_distance_over_deadlines, backend)
+            heap_greedy, scan_greedy = algs.Greedy(), algs.Greedy(use_heaps=False)
+            for run in range(2):
+                sim.reset()
+                for step in range(100):
+                    add_random_nodes(sim, rng, max_k=2)
+                    matching = heap_greedy.compute_matching(sim)
+                    assert matching == scan_greedy.compute_matching(sim)
+                    for b, s in matching:
+                        sim.remove_matching(b, s)
+                    sim.advance(recalc)
+    print("Greedy heap tests completed successfully in {} sec".format(time.time() - A))
+
+def tentative_weight(alg, sim):
+    return sum(sim.weight(b, s) for s, b in alg.matching_s.items())
+
+def max_weight(sim):
+    G = nx.Graph()
+    for b in sim.buyer_nodes:
+        for s in sim.seller_nodes:
+            if (sim.node_attr(b, 'in_market') and sim.node_attr(s, 'in_market')
+                    and sim.has_edge(b, s)):
+                G.add_edge(('b', b), ('s', s), weight=sim.weight(b, s))
+    return sum(G.edges[e]['weight'] for e in nx.max_weight_matching(G))
+
+def check_epsilon_optimal(alg, sim):
+    # every matched buyer within eps of its best profit, unmatched buyers have
+    # no positive profit, unmatched sellers have price 0
+    buyers = [b for b in sim.buyer_nodes if sim.node_attr(b, 'in_market')]
+    sellers = [s for s in sim.seller_nodes if sim.node_attr(s, 'in_market')]
+    seller_of_b = {b: s for s, b in alg.matching_s.items()}
+    for b in buyers:
+        best = max([sim.weight(b, s) - alg.price_s[s] for s in sellers if sim.has_edge(b, s)] + [0])
+        s_b = seller_of_b.get(b)
+        profit = 0 if s_b is None else sim.weight(b, s_b) - alg.price_s[s_b]
+        assert profit >= best - alg.eps - 1e-9
+    for s in sellers:
+        assert s in alg.matching_s or alg.price_s[s] == 0
+    matched = len(alg.matching_s)
+    assert tentative_weight(alg, sim) >= max_weight(sim) - matched * alg.eps - 1e-9
+
+def test_dfa_incremental():
+    # warm-started auction vs. from scratch on the same sequence of markets
+    A = time.time()
+    for stochastic, kwargs in ((False, {}), (True, {}), (False, dict(top_k=2)), (True, dict(top_k=3))):
+        rng = np.random.RandomState(4)
+        sim = simulator.Simulator(weights.inverse_squared_distance, **kwargs)
+        warm = algs.DynamicDeferredAcceptance(stochastic, guess=3, incremental=True)
+        scratch = algs.DynamicDeferredAcceptance(stochastic, guess=3)
+        for step in range(150):
+            add_random_nodes(sim, rng, max_k=1)
+            matching = scratch.compute_matching(sim)
+            warm.compute_matching(sim)
+            check_epsilon_optimal(scratch, sim)
+            check_epsilon_optimal(warm, sim)
+            n_matched = max(len(warm.matching_s), len(scratch.matching_s))
+            assert abs(tentative_weight(warm, sim) - tentative_weight(scratch, sim)) <= n_matched * warm.eps + 1e-9
+            for b, s in matching:
+                sim.remove_matching(b, s)
+            sim.advance()
+        # candidate lists changing does not throw the warm state away
+        assert sim.weight_epoch == 0 and warm._warm_sim is sim
+    print("Incremental DDA tests completed successfully in {} sec".format(time.time() - A))
+
+def count_argmax_calls(alg):
+    calls = [0]
+    for name in ('_argmax', '_argmax2'):
+        method = getattr(alg, name)
+        def counted(b, sim, method=method):
+            calls[0] += 1
+            return method(b, sim)
+        setattr(alg, name, counted)
+    return calls
+
+def test_eps_scaling():
+    A = time.time()
+    simple_test_cases(algs.DynamicDeferredAcceptance(eps_scaling=True))
+    simple_test_cases(algs.DeferredWithLookAhead(5, eps_scaling=True))
+    # contested sellers: fixed increments need ~1/eps bids each, scaling a handful
+    sim = simulator.Simulator(weights.inverse_squared_distance)
+    for i in range(10):
+        sim.add_node(pos=(0,0), d=3, buyer=True)
+    for i in range(3):
+        sim.add_node(pos=(0,0), d=3, buyer=False)
+    fixed, scaled = algs.DynamicDeferredAcceptance(), algs.DynamicDeferredAcceptance(eps_scaling=True)
+    fixed_calls, scaled_calls = count_argmax_calls(fixed), count_argmax_calls(scaled)
+    fixed.compute_matching(sim)
+    scaled.compute_matching(sim)
+    check_epsilon_optimal(fixed, sim)
+    check_epsilon_optimal(scaled, sim)
+    assert 10 * scaled_calls[0] < fixed_calls[0]
+    # random markets, lookahead with k = 0 so its valid pairs are the in-market ones
+    for alg in (algs.DynamicDeferredAcceptance(eps_scaling=True),
+                algs.DeferredWithLookAhead(3, eps_scaling=True)):
+        rng = np.random.RandomState(5)
+        sim = simulator.Simulator(weights.inverse_squared_distance)
+        for step in range(100):
+            add_random_nodes(sim, rng)
+            matching = alg.compute_matching(sim)
+            check_epsilon_optimal(alg, sim)
+            for b, s in matching:
+                sim.remove_matching(b, s)
+            sim.advance()
+    # a realistic market: fewer bids must not cost more wall-clock time overall
+    # (~1 s for plain DDA here; settling stale sellers once made eps-scaling 3x slower)
+    runtimes = []
+    for alg in (algs.DynamicDeferredAcceptance(), algs.DynamicDeferredAcceptance(eps_scaling=True)):
+        inter = interface.Interface(alg, simulator.Simulator(weights.inverse_squared_distance),
+                                    seed=0, max_to_add=8, dep_distr=(20, 5))
+        B = time.perf_counter()
+        inter.run(80)
+        runtimes.append(time.perf_counter() - B)
+    assert runtimes[1] < runtimes[0]
+    print("eps-scaling tests completed successfully in {} sec".format(time.time() - A))
+
+def test_max_weight_matching():
+    A = time.time()
+    simple_test_cases(algs.BatchingAlgorithm(algs.MaxWeightMatching(), batch=1))
+    for backend in ("networkx", "array"):
+        simple_test_cases(algs.MaxWeightMatching(), backend=backend)
+        rng = np.random.RandomState(7)
+        sim = simulator.make_simulator(weights.squared_distance_over_deadlines, backend)
+        alg = algs.BatchingAlgorithm(algs.MaxWeightMatching(), batch=3)
+        for step in range(100):
+            add_random_nodes(sim, rng, max_k=2)
+            matching = alg.compute_matching(sim)
+            if sim.t % 3 == 0:
+                matching_s = alg.max_weight_alg.matching_s
+                assert abs(tentative_weight(alg.max_weight_alg, sim) - max_weight(sim)) < 1e-9
+                assert matching == [(matching_s[s], s) for s in sim.critical_sellers(3)
+                                    if s in matching_s]
+            for b, s in matching:
+                sim.remove_matching(b, s)
+            sim.advance(recalc_weights=True)
+    print("Max weight matching tests completed successfully in {} sec".format(time.time() - A))
+
+def offline_by_replay(arrivals, weight_func):
+    # every pair that is in the market together at some tick, with the weight
+    # the simulator gives it, solved with networkx
+    sim = simulator.Simulator(weight_func)
+    G = nx.Graph()
+    i = 0
+    while i < len(arrivals) or len(sim.G) > 0:
+        while i < len(arrivals) and arrivals[i][0] == sim.t:
+            t, pos, d, buyer, k = arrivals[i]
+            sim.add_node(pos, d, buyer, k)
+            i += 1
+        for b in sim.buyer_nodes:
+            for s in sim.seller_nodes:
+                if (sim.node_attr(b, 'in_market') and sim.node_attr(s, 'in_market')
+                        and sim.weight(b, s) > 0):
+                    G.add_edge(('b', b), ('s', s), weight=sim.weight(b, s))
+        sim.advance()
+    return sum(G.edges[e]['weight'] for e in nx.max_weight_matching(G))
+
+def test_offline():
+    A = time.time()
+    rng = np.random.RandomState(6)
+    for weight_func in (weights.inverse_squared_distance, weights.squared_distance_over_deadlines):
+        arrivals = []
+        for t in range(60):
+            for j in range(rng.randint(0, 4)):
+                pos = (rng.randint(0, 10), rng.randint(0, 10))
+                arrivals.append((t, pos, rng.randint(1, 5), bool(rng.randint(2)), rng.randint(0, 3)))
+        total, matching = algs.offline_max_weight_matching(arrivals, weight_func)
+        assert abs(total - offline_by_replay(arrivals, weight_func)) < 1e-9
+        buyers, sellers = zip(*matching)
+        assert len(set(buyers)) == len(buyers) and len(set(sellers)) == len(sellers)
+        assert all(arrivals[b][3] and not arrivals[s][3] for b, s in matching)
+    assert algs.offline_max_weight_matching([], weight_function) == (0.0, [])
+    # no online run beats the offline optimum of its own arrivals
+    for alg in (algs.Greedy(), algs.DynamicDeferredAcceptance()):
+        inter = interface.Interface(alg, simulator.Simulator(weight_function), max_to_add=3)
+        weights_found = inter.run(100)[0]
+        assert len(inter.trace) == inter.sim.n + 1
+        assert algs.offline_max_weight_matching(inter.trace, weight_function) == \
+            algs.offline_max_weight_matching(inter.trace.records(), weight_function)
+        assert 0 < algs.competitive_ratio(weights_found, inter.trace, weight_function) <= 1 + 1e-9
+    print("Offline oracle tests completed successfully in {} sec".format(time.time() - A))
+
+def test_sparse_markets():
+    # algorithms only touch existing edges (radius) / candidate edges (top_k);
+    # with a radius covering the whole market or k above the market size the
+    # matchings are the dense ones (k = 0: lookahead matches on valid pairs,
+    # not in-market ones)
+    A = time.time()
+    for make_alg in (algs.Greedy, lambda: algs.Greedy(use_heaps=False),
+                     lambda: algs.DynamicDeferredAcceptance(guess=3, incremental=True),
+                     lambda: algs.DynamicDeferredAcceptance(eps_scaling=True),
+                     lambda: algs.DeferredWithLookAhead(3),
+                     lambda: algs.BatchingAlgorithm(algs.MaxWeightMatching(), batch=2)):
+        matchings = {}
+        for sparsity in ((), (("radius", 10),), (("radius", 2),), (("top_k", 100),),
+                         (("top_k", 2),), (("radius", 3), ("top_k", 1))):
+            rng = np.random.RandomState(8)
+            sim = simulator.Simulator(weights.inverse_squared_distance, **dict(sparsity))
+            alg = make_alg()
+            matchings[sparsity] = []
+            for step in range(100):
+                add_random_nodes(sim, rng)
+                matching = alg.compute_matching(sim)
+                if isinstance(alg, algs.DynamicDeferredAcceptance):
+                    check_epsilon_optimal(alg, sim)
+                for b, s in matching:
+                    assert sim.has_edge(b, s)
+                    sim.remove_matching(b, s)
+                matchings[sparsity].append(matching)
+                sim.advance()
+        assert matchings[()] == matchings[(("radius", 10),)] == matchings[(("top_k", 100),)]
+    # heap and scan greedy agree on sparse markets too
+    for sparsity in (dict(radius=2), dict(top_k=2)):
+        rng = np.random.RandomState(9)
+        sim = simulator.Simulator(weights.squared_distance_over_deadlines, **sparsity)
+        heap_greedy, scan_greedy = algs.Greedy(), algs.Greedy(use_heaps=False)
+        for step in range(100):
+            add_random_nodes(sim, rng, max_k=2)
+            matching = heap_greedy.compute_matching(sim)
+            assert matching == scan_greedy.compute_matching(sim)
+            for b, s in matching:
+                sim.remove_matching(b, s)
+            sim.advance(True)
+    print("Sparse market tests completed successfully in {} sec".format(time.time() - A))
+
+def test_vectorized_greedy():
+    A = time.time()
+    for backend in ("networkx", "array"):
+        simple_test_cases(algs.VectorizedGreedy(), backend=backend)
+    # same matchings, tentative matches and prices as Greedy; integer
+    # positions make plenty of ties
+    for weight_func in (weights.inverse_squared_distance, weights.squared_distance_over_deadlines):
+        for backend, kwargs in (("networkx", {}), ("networkx", dict(top_k=2)), ("array", {})):
+            rng = np.random.RandomState(10)
+            sim = simulator.make_simulator(weight_func, backend, **kwargs)
+            greedy, vectorized = algs.Greedy(), algs.VectorizedGreedy()
+            for step in range(150):
+                add_random_nodes(sim, rng, max_k=2)
+                matching = greedy.compute_matching(sim)
+                assert matching == vectorized.compute_matching(sim)
+                assert greedy.m == vectorized.m
+                # (Greedy's price defaultdict also holds the sellers it only looked up)
+                assert all(greedy.p[s] == vectorized.p[s] for s in greedy.p)
+                for b, s in matching:
+                    sim.remove_matching(b, s)
+                sim.advance(recalc_weights=True)
+    inter = interface.Interface(algs.VectorizedGreedy(), simulator.Simulator(weight_function),
+                                seed=3, max_to_add=6)
+    assert inter.run(200) == interface.Interface(
+        algs.Greedy(), simulator.Simulator(weight_function), seed=3, max_to_add=6).run(200)
+    print("Vectorized greedy tests completed successfully in {} sec".format(time.time() - A))
+
+def test_vectorized_auction():
+    A = time.time()
+    simple_test_cases(algs.DynamicDeferredAcceptance(vectorized=True))
+    simple_test_cases(algs.DynamicDeferredAcceptance(vectorized=True), backend="array")
+    def prices(alg):
+        return {s: p for s, p in alg.price_s.items() if p != 0}
+    for stochastic in (False, True):
+        for backend, kwargs in (("networkx", {}), ("networkx", dict(top_k=2)), ("array", {})):
+            rng = np.random.RandomState(11)
+            sim = simulator.make_simulator(weights.inverse_squared_distance, backend, **kwargs)
+            dda = algs.DynamicDeferredAcceptance(stochastic, guess=3)
+            vectorized = algs.DynamicDeferredAcceptance(stochastic, guess=3, vectorized=True)
+            for step in range(150):
+                add_random_nodes(sim, rng, max_k=2)
+                matching = dda.compute_matching(sim)
+                assert matching == vectorized.compute_matching(sim)
+                assert dda.matching_s == vectorized.matching_s
+                assert dda.seller_of_b == vectorized.seller_of_b
+                assert prices(dda) == prices(vectorized)
+                for b, s in matching:
+                    sim.remove_matching(b, s)
+                sim.advance()
+    try:
+        algs.DynamicDeferredAcceptance(incremental=True, vectorized=True)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("incremental and vectorized should not combine")
+    print("Vectorized auction tests completed successfully in {} sec".format(time.time() - A))
+
+class ReferenceLookAhead(algs.DeferredWithLookAhead):
+    # the look-ahead rule read off the node attributes on every check
+    def _valid_sellers(self, b, sim):
+        for s, v_bs in sim.neighbors(b):
+            if self._valid_match(sim, s, b):
+                yield s, v_bs
+
+    def _valid_match(self, sim, s, b):
+        b_k = sim.node_attr(b, 'k')
+        return b_k <= self.threshold and sim.node_attr(s, 'k') <= self.threshold and sim.node_attr(s, 'd') > b_k
+
+def test_lookahead_eligible():
+    A = time.time()
+    for backend in ("networkx", "array"):
+        for threshold, eps_scaling in ((0, False), (2, False), (5, True)):
+            rng = np.random.RandomState(12)
+            sim = simulator.make_simulator(weights.inverse_squared_distance, backend)
+            alg = algs.DeferredWithLookAhead(threshold, eps_scaling=eps_scaling)
+            reference = ReferenceLookAhead(threshold, eps_scaling=eps_scaling)
+            for step in range(80):
+                add_random_nodes(sim, rng, max_k=4)
+                if step % 5 == 3:
+                    # sets kept across skipped steps (as under BatchingAlgorithm)
+                    sim.advance()
+                    continue
+                matching = alg.compute_matching(sim)
+                assert matching == reference.compute_matching(sim)
+                assert alg.matching_s == reference.matching_s
+                assert {s: p for s, p in alg.price_s.items() if p} == \
+                    {s: p for s, p in reference.price_s.items() if p}
+                for b, s in matching:
+                    if sim.node_attr(b, 'in_market') and sim.node_attr(s, 'in_market'):
+                        sim.remove_matching(b, s)
+                sim.advance()
+        # a reset and rebuild to the same tick and node count: nothing carried over
+        sim = simulator.make_simulator(weights.inverse_squared_distance, backend)
+        alg, fresh = algs.DeferredWithLookAhead(2), algs.DeferredWithLookAhead(2)
+        sim.add_node(pos=(0,0), d=3, buyer=False)
+        sim.add_node(pos=(0,0), d=3, buyer=True, k=2)
+        alg.compute_matching(sim)
+        assert alg.matching_s == {0: 1}
+        sim.reset()
+        sim.add_node(pos=(0,0), d=1, buyer=False)
+        sim.add_node(pos=(0,0), d=3, buyer=True, k=2)
+        assert alg.compute_matching(sim) == fresh.compute_matching(sim)
+        assert alg.matching_s == fresh.matching_s == {}
+        assert alg._eligible_by_k == fresh._eligible_by_k == {0: {0}, 1: set(), 2: set()}
+    print("Look-ahead eligible set tests completed successfully in {} sec".format(time.time() - A))
+
+def test_lazy_weights():
+    # same runs on a simulator computing weights on demand, even with a cache
+    # much smaller than the market
+    A = time.time()
+    # (the auctions get long with squared distances, so they run on inverse ones)
+    for make_alg, weight_func in (
+            (algs.Greedy, weights.squared_distance_over_deadlines),
+            (lambda: algs.BatchingAlgorithm(algs.MaxWeightMatching(), batch=3),
+             weights.squared_distance_over_deadlines),
+            (algs.DynamicDeferredAcceptance, weights.inverse_squared_distance),
+            (lambda: algs.DeferredWithLookAhead(3), weights.inverse_squared_distance)):
+        results = []
+        for sim in (simulator.Simulator(weight_func),
+                    simulator.Simulator(weight_func, lazy=True, cache_size=32)):
+            inter = interface.Interface(make_alg(), sim, seed=4, max_to_add=4, dep_distr=(4, 1),
+                                        recalc_weights=True)
+            results.append(inter.run(60))
+        assert results[0] == results[1]
+        if isinstance(inter.max_weight_alg, algs.Greedy):
+            # the heaps would hold every buyer-seller weight, past the cache
+            assert inter.max_weight_alg._heaps == {}
+    print("Lazy weight tests completed successfully in {} sec".format(time.time() - A))
+
+def test_array_backend():
+    A = time.time()
+    simple_test_cases(algs.Greedy(), backend="array")
+    simple_test_cases(algs.DynamicDeferredAcceptance(), backend="array")
+    simple_test_cases(algs.DeferredWithLookAhead(5), backend="array")
+    simple_test_cases(algs.BatchingAlgorithm(algs.Greedy(), batch=1), backend="array")
+    print("Array backend tests completed successfully in {} sec".format(time.time() - A))
+
+def test_kernels():
+    # the kernels (compiled if Numba is installed, plain Python otherwise)
+    # against the reference paths
+    A = time.time()
+    enabled = kernels.enabled
+    rng = np.random.RandomState(12)
+    try:
+        for shape in ((0, 3), (3, 0), (5, 5), (8, 3), (3, 8)):
+            W = rng.randint(0, 4, size=shape) / 4
+            kernels.enabled = False
+            reference = ascending_auction(W, 1e-3)
+            kernels.enabled = True
+            for expected, result in zip(reference, ascending_auction(W, 1e-3)):
+                assert np.array_equal(expected, result)
+
+        def run(use_kernels):
+            kernels.enabled = use_kernels
+            rng = np.random.RandomState(13)
+            sim = simulator.make_simulator(weights.inverse_squared_distance, "array")
+            greedy, dda = algs.VectorizedGreedy(), algs.DynamicDeferredAcceptance(vectorized=True)
+            steps = []
+            for step in range(80):
+                add_random_nodes(sim, rng, max_k=2)
+                matching = dda.compute_matching(sim)
+                steps.append((sim.critical_sellers(), sim.critical_sellers(2),
+                              greedy.compute_matching(sim), dict(greedy.p),
+                              matching, dict(dda.price_s), dict(dda.marginal_profit_b)))
+                for b, s in matching:
+                    sim.remove_matching(b, s)
+                sim.advance()
+            return steps
+        assert run(False) == run(True)
+    finally:
+        kernels.enabled = enabled
+    print("Kernel tests (Numba {}) completed successfully in {} sec".format(
+        "installed" if kernels.HAVE_NUMBA else "not installed", time.time() - A))
+
 def test_all():
     test_abstract()
     test_greedy()
     test_dfa()
     test_batching()
+    test_greedy_heaps()
+    test_dfa_incremental()
+    test_eps_scaling()
+    test_offline()
+    test_max_weight_matching()
+    test_sparse_markets()
+    test_vectorized_greedy()
+    test_vectorized_auction()
+    test_lookahead_eligible()
+    test_lazy_weights()
+    test_array_backend()
+    test_kernels()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,15 @@
+import os
+import tempfile
 import time
 import sys
 sys.path.append("..")
+import numpy as np
 import interface
+from arrivals import ArrivalTrace
+from profiler import Profiler, SIM_PHASES, ALG_PHASES, ALG_COUNTERS
 import simulator
 import algs
+import weights
 
 # TODO all of these tests...
 def test_interface():
@@ -20,6 +26,108 @@ def test_interface():
     B = time.time()
     print("Interface tests completed successfully in {} sec".format(B - A))
 
+def test_reproducible_arrivals():
+    A = time.time()
+    def make(seed, **kwargs):
+        return interface.Interface(
+            algs.Greedy(), simulator.Simulator(weights.inverse_squared_distance),
+            seed=seed, max_to_add=4, **kwargs)
+    # interleaved interfaces with the same seed do not disturb each other
+    first, second, other = make(3), make(3), make(4)
+    global_state = np.random.get_state()[1].copy()
+    for step in range(3):
+        res_first = first.run(100)
+        other.run(50)
+        res_second = second.run(100)
+        assert res_first == res_second
+        assert first.trace == second.trace
+    assert first.trace != other.trace
+    assert (np.random.get_state()[1] == global_state).all()
+    # the first steps do not depend on the length of the run
+    short, long = make(5, p_buyer=0.3), make(5, p_buyer=0.3)
+    short.run(40)
+    long.run(interface.Interface.block_size + 10)
+    assert short.trace.records() == [a for a in long.trace.records() if a[0] < 40]
+    assert {a[1] for a in long.trace.records()} <= {(x, y) for x in range(11) for y in range(11)}
+    assert long.trace.d.min() >= 1
+    print("Reproducible arrival tests completed successfully in {} sec".format(time.time() - A))
+
+def test_trace_replay():
+    A = time.time()
+    recorder = interface.Interface(
+        algs.Greedy(), simulator.Simulator(weights.inverse_squared_distance), seed=2, max_to_add=4)
+    expected = recorder.run(200)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.npz")
+        recorder.trace.save(path)
+        trace = ArrivalTrace.load(path)
+    assert trace == recorder.trace
+    assert trace[0] == recorder.trace.records()[0]
+    # same arrivals for every algorithm and backend, without drawing any
+    for alg, backend in ((algs.Greedy(), "networkx"), (algs.Greedy(), "array"),
+                         (algs.DynamicDeferredAcceptance(), "networkx")):
+        replayer = interface.Interface(
+            alg, simulator.make_simulator(weights.inverse_squared_distance, backend), seed=9)
+        state = replayer.rng.bit_generator.state
+        res = replayer.run(200, trace=trace)
+        assert replayer.trace == trace
+        assert replayer.rng.bit_generator.state == state
+        if isinstance(alg, algs.Greedy):
+            assert res == expected
+    # k is replayed too, and arrivals after the last step are left out
+    trace = ArrivalTrace.from_records([(0, (0, 0), 2, True, 0), (1, (1, 1), 2, False, 2),
+                                       (5, (2, 2), 2, False, 0)])
+    replayer = interface.Interface(algs.Greedy(), simulator.Simulator(weights.inverse_squared_distance))
+    weights_found = replayer.run(3, trace=trace)[0]
+    assert weights_found == [] and replayer.trace.records() == trace.records()[:2]
+    print("Trace replay tests completed successfully in {} sec".format(time.time() - A))
+
+def test_profiler():
+    A = time.time()
+    for make_alg in (algs.Greedy, algs.DynamicDeferredAcceptance,
+                     lambda: algs.BatchingAlgorithm(algs.DeferredWithLookAhead(3), batch=2)):
+        def make(profiler=None):
+            return interface.Interface(
+                make_alg(), simulator.Simulator(weights.inverse_squared_distance),
+                seed=1, max_to_add=4, profiler=profiler)
+        profiler = Profiler()
+        inter = make(profiler)
+        # instrumentation does not change what happens
+        assert inter.run(100) == make().run(100)
+        assert len(profiler.steps) == 100
+        assert [row['step'] for row in profiler.steps] == list(range(100))
+        totals = profiler.summary()
+        assert totals['compute_matching_calls'] == 100 == totals['advance_calls']
+        assert totals['add_node_calls'] == len(inter.trace)
+        assert totals['argmax_calls'] == sum(row.get('argmax_calls', 0) for row in profiler.steps) > 0
+        assert 0 < totals['process_buyers_time'] <= totals['compute_matching_time']
+        assert totals['peak_buyers'] == max(row['buyers'] for row in profiler.steps)
+        # wrappers come off after the run
+        alg = inter.max_weight_alg
+        wrapped = set(SIM_PHASES) | set(ALG_PHASES) | set(ALG_COUNTERS)
+        for obj in (inter.sim, alg, getattr(alg, 'max_weight_alg', alg)):
+            assert not wrapped & set(vars(obj))
+    # bid chains are counted per step, and the trace is written as CSV
+    inter = make(Profiler())
+    inter.max_weight_alg = algs.DynamicDeferredAcceptance()
+    inter.run(50)
+    assert inter.profiler.summary()['bid_chains_calls'] > 0
+    # the vectorized auction is timed as buyer processing too
+    vectorized = make(Profiler())
+    vectorized.max_weight_alg = algs.DynamicDeferredAcceptance(vectorized=True)
+    vectorized.run(50)
+    assert vectorized.profiler.summary()['process_buyers_calls'] == 50
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "steps.csv")
+        inter.profiler.save_trace(path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+    assert lines[0].startswith("step,") and len(lines) == 51
+    print("Profiler tests completed successfully in {} sec".format(time.time() - A))
+
 
 if __name__ == "__main__":
 	test_interface()
+	test_reproducible_arrivals()
+	test_trace_replay()
+	test_profiler()
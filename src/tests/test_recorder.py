@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import time
+sys.path.append("..")
+
+import numpy as np
+
+import algs
+import interface
+import metrics
+import simulator
+import weights
+from recorder import MetricsRecorder, ResultRecorder
+
+def make_interface(block_size=interface.Interface.block_size):
+    inter = interface.Interface(
+        algs.Greedy(), simulator.Simulator(weights.inverse_squared_distance),
+        seed=11, max_to_add=3, p_buyer=0.4)
+    inter.block_size = block_size
+    return inter
+
+def run(recorder=None):
+    return make_interface().run(300, recorder=recorder)
+
+def test_result_recorder():
+    A = time.time()
+    weights_found, discarded_buyers, discarded_sellers, matched_wait_times = run()
+    expected = metrics.summarize(weights_found, discarded_buyers, discarded_sellers)
+    n_nodes = 2 * len(weights_found) + expected["num_discarded_buyers"] + expected["num_discarded_sellers"]
+    with tempfile.TemporaryDirectory() as tmp:
+        for recorder in (ResultRecorder(capacity=1),
+                         ResultRecorder(chunk_dir=os.path.join(tmp, "run"), chunk_size=64, capacity=4)):
+            assert run(recorder) is recorder
+            assert recorder.column('matches', 'weight').tolist() == [w for w, _ in weights_found]
+            assert recorder.column('matches', 'step').tolist() == [i for _, i in weights_found]
+            assert list(zip(recorder.column('matches', 'buyer_wait').tolist(),
+                            recorder.column('matches', 'seller_wait').tolist())) == matched_wait_times
+            assert recorder.column('advances', 'discarded_buyers').tolist() == [d for d, _ in discarded_buyers]
+            assert recorder.column('advances', 'discarded_sellers').tolist() == [d for d, _ in discarded_sellers]
+            summary = recorder.summary()
+            for key, value in expected.items():
+                assert abs(summary[key] - value) < 1e-12
+            assert abs(summary["pct_discarded_buyers"]
+                       - 100 * expected["num_discarded_buyers"] / n_nodes) < 1e-12
+        # 300 advances in chunks of 64, the last one written by result()
+        assert recorder.num_chunks['advances'] == 5
+        assert len(os.listdir(os.path.join(tmp, "run"))) == \
+            3 * recorder.num_chunks['advances'] + 4 * recorder.num_chunks['matches']
+        assert all(len(buffer.values()) == 0 for buffer in recorder.buffers['matches'].values())
+    print("Result recorder tests completed successfully in {} sec".format(time.time() - A))
+
+def test_metrics_recorder():
+    A = time.time()
+    weights_found, discarded_buyers, discarded_sellers, matched_wait_times = make_interface(16).run(300)
+    expected = metrics.summarize(weights_found, discarded_buyers, discarded_sellers)
+    bins = [1, 2, 3, 4]
+    recorder = MetricsRecorder(wait_bins=bins)
+    inter = make_interface(16)
+    aggregates = inter.run(300, recorder=recorder)
+    assert aggregates.keys() == expected.keys()
+    for key, value in expected.items():
+        assert abs(aggregates[key] - value) < 1e-12
+    buyer_waits, seller_waits = np.clip(np.array(matched_wait_times), 1, 4).T
+    assert recorder.buyer_wait_hist.tolist() == np.histogram(buyer_waits, bins)[0].tolist()
+    assert recorder.seller_wait_hist.tolist() == np.histogram(seller_waits, bins)[0].tolist()
+    # nothing kept per node beyond the nodes of the last block
+    assert inter.trace is None
+    assert len(inter.node_original_wait_times) <= 16 * 3 + len(inter.sim.buyer_nodes) + len(inter.sim.seller_nodes)
+    # no matches at all
+    assert np.isnan(MetricsRecorder().result()["avg_weight_matching"])
+    empty = MetricsRecorder()
+    empty.record_advance(0, 2, 1)
+    assert np.isnan(empty.result()["avg_weight_per_node"])
+    assert empty.result()["weight_per_node_stddev"] == 0
+    print("Metrics recorder tests completed successfully in {} sec".format(time.time() - A))
+
+def main():
+    test_result_recorder()
+    test_metrics_recorder()
+
+if __name__ == "__main__":
+    main()
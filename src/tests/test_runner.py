@@ -0,0 +1,109 @@
+import csv
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+sys.path.append("..")
+
+import numpy as np
+
+import algs
+import interface
+import metrics
+import runner
+import simulator
+import weights
+from benchmarks import scaling
+
+def test_summarize():
+    A = time.time()
+    res = ([(0.5, 1), (1.0, 3), (0.25, 4)], [(1, 0), (0, 1), (2, 2)], [(0, 0), (1, 1)])
+    # make_dataframe in experiments/BasicExperiment.ipynb, inlined
+    just_weights = [w[0] for w in res[0]]
+    n_discarded = 3 + 1
+    weights_with_0s = []
+    for match in just_weights:
+        weights_with_0s.extend([match, match])
+    weights_with_0s.extend([0]*n_discarded)
+    aggregates = metrics.summarize(*res)
+    assert aggregates["avg_weight_matching"] == np.mean(just_weights)
+    assert aggregates["avg_weight_per_node"] == np.mean(just_weights) * 6 / 10
+    assert abs(aggregates["weight_per_node_stddev"] - np.std(weights_with_0s)) < 1e-12
+    assert aggregates["num_discarded_buyers"] == 3
+    assert aggregates["num_discarded_sellers"] == 1
+    print("Summarize tests completed successfully in {} sec".format(time.time() - A))
+
+def test_runner():
+    A = time.time()
+    tasks = runner.experiment_grid(
+        [("Greedy", algs.Greedy), ("LookAhead3", partial(algs.DeferredWithLookAhead, 3))],
+        [dict(weight_func=weights.inverse_squared_distance, num_steps=60, max_to_add=3),
+         dict(weight_func=weights.inverse_squared_distance, num_steps=40, backend="array",
+              p_buyer=0.3)],
+        seeds=[0, 1])
+    assert len(tasks) == 8
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.csv")
+        rows = list(runner.run_experiments(tasks, max_workers=2, results_path=path))
+        with open(path) as f:
+            table = list(csv.DictReader(f))
+    assert len(rows) == len(table) == 8
+    assert sorted(row["p_buyer"] for row in table) == [""] * 4 + ["0.3"] * 4
+    # same rows, in whatever order they finished, as running the tasks here
+    key = lambda row: (row["algorithm"], row["backend"], row["seed"])
+    parallel = {key(row): row for row in rows}
+    for row in runner.run_experiments(tasks, max_workers=0):
+        assert parallel[key(row)]["avg_weight_per_node"] == row["avg_weight_per_node"]
+        assert parallel[key(row)]["num_discarded_buyers"] == row["num_discarded_buyers"]
+    # and the same as a plain Interface run with that seed
+    inter = interface.Interface(algs.Greedy(), simulator.Simulator(weights.inverse_squared_distance),
+                                max_to_add=3, seed=1)
+    expected = metrics.summarize(*inter.run(60)[:3])
+    for key, value in expected.items():
+        assert abs(parallel[("Greedy", "networkx", 1)][key] - value) < 1e-12
+    print("Runner tests completed successfully in {} sec".format(time.time() - A))
+
+def test_scaling_compare():
+    A = time.time()
+    def record(case, algorithm, backend="networkx", **values):
+        r = dict(case=case, backend=backend, algorithm=algorithm, num_steps=100, seed=0,
+                 total_weight=10.0, steps_per_sec=100.0, latency_p99_ms=2.0, peak_memory_kb=500.0)
+        r.update(values)
+        return r
+    baseline = [record("base", "Greedy"), record("base", "DDA"),
+                record("base", "Greedy", backend="array")]
+    # several matching results in a row, as the CLI compares them
+    results = [record("base", "Greedy"), record("base", "DDA"), record("base", "Greedy", backend="array"),
+               record("size_50", "Greedy", total_weight=1.0)]     # no baseline: skipped
+    assert scaling.compare(results, baseline, 0.3) == ([], [])
+    # baselines without a backend are NetworkX runs
+    old = [{k: v for k, v in r.items() if k != "backend"} for r in baseline[:2]]
+    assert scaling.compare(results, old, 0.3) == ([], [])
+
+    results = [record("base", "Greedy", total_weight=11.0),
+               record("base", "DDA", steps_per_sec=50.0, latency_p99_ms=5.0),
+               record("base", "Greedy", backend="array", peak_memory_kb=1000.0)]
+    problems, warnings = scaling.compare(results, baseline, 0.3)
+    assert [p.split(":")[0] for p in problems] == ["base/networkx/Greedy", "base/array/Greedy"]
+    assert "total weight" in problems[0] and "peak_memory_kb" in problems[1]
+    # timings come from another machine: slower only warns, unless check_speed
+    assert len(warnings) == 2 and all(w.startswith("base/networkx/DDA") for w in warnings)
+    problems, warnings = scaling.compare(results, baseline, 0.3, check_speed=True)
+    assert len(problems) == 4 and warnings == []
+    # within tolerance
+    assert scaling.compare([record("base", "DDA", steps_per_sec=80.0, peak_memory_kb=600.0)],
+                           baseline, 0.3) == ([], [])
+    # a different run is reported, not compared
+    problems, warnings = scaling.compare([record("base", "DDA", num_steps=50, total_weight=1.0)],
+                                         baseline, 0.3)
+    assert len(problems) == 1 and "baseline ran 100 steps" in problems[0]
+    print("Scaling compare tests completed successfully in {} sec".format(time.time() - A))
+
+def main():
+    test_summarize()
+    test_runner()
+    test_scaling_compare()
+
+if __name__ == "__main__":
+    main()
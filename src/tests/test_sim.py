@@ -1,4 +1,8 @@
-from simulator import Simulator
+import numpy as np
+
+from simulator import Simulator, make_simulator
+from spatial import GridIndex
+import weights
 
 """
 ************************************************************************
@@ -16,6 +20,14 @@ def main():
     test_dynamic_weights()
     test_look_ahead()
     test_removal()
+    test_array_backend()
+    test_vectorized_weights()
+    test_timer_mechanics()
+    test_radius_pruning()
+    test_top_k_candidates()
+    test_snapshot()
+    test_lazy_weights()
+    test_separable_weights()
 
 
 # Basic functionality
@@ -127,5 +139,297 @@ def test_removal():
     assert(removed_buyers == 2)
     assert(removed_sellers == 1)
 
+# The array backend should see exactly the same market as the NetworkX one
+def test_array_backend():
+    def weight_function_d(buyer_pos, buyer_d, seller_pos, seller_d):
+        bx, by = buyer_pos
+        sx, sy = seller_pos
+        return ((bx-sx)**2 + (by-sy)**2) / buyer_d / seller_d
+
+    rng = np.random.RandomState(0)
+    graph_sim = make_simulator(weight_function_d, "networkx")
+    array_sim = make_simulator(weight_function_d, "array", capacity=2)
+    for step in range(60):
+        for _ in range(rng.randint(0, 4)):
+            node = dict(
+                pos=(int(rng.randint(0, 10)), int(rng.randint(0, 10))),
+                d=int(rng.randint(1, 5)),
+                buyer=bool(rng.rand() < 0.5),
+                k=int(rng.randint(0, 3)))
+            graph_sim.add_node(**node)
+            array_sim.add_node(**node)
+        assert graph_sim.buyer_nodes == array_sim.buyer_nodes
+        assert graph_sim.seller_nodes == array_sim.seller_nodes
+        for i in graph_sim.buyer_nodes | graph_sim.seller_nodes:
+            for key in ('d', 'k', 'in_market', 'added_at', 'buyer'):
+                assert graph_sim.node_attr(i, key) == array_sim.node_attr(i, key)
+            assert graph_sim.is_critical(i) == array_sim.is_critical(i)
+        for b in graph_sim.buyer_nodes:
+            for s in graph_sim.seller_nodes:
+                assert np.isclose(graph_sim.weight(b, s), array_sim.weight(b, s))
+        # arrival-ordered indexes
+        assert list(graph_sim.seller_nodes) == sorted(graph_sim.seller_nodes)
+        for critical_at in (1, 2, 3):
+            expected = [s for s in sorted(graph_sim.seller_nodes) if graph_sim.is_critical(s, critical_at)]
+            assert graph_sim.critical_sellers(critical_at) == expected
+            assert array_sim.critical_sellers(critical_at) == expected
+        # match the first pair that is allowed to match
+        live_b = [b for b in sorted(graph_sim.buyer_nodes) if graph_sim.node_attr(b, 'in_market')]
+        live_s = [s for s in sorted(graph_sim.seller_nodes) if graph_sim.node_attr(s, 'in_market')]
+        if step % 3 == 0 and live_b and live_s:
+            assert np.isclose(graph_sim.remove_matching(live_b[0], live_s[0]),
+                              array_sim.remove_matching(live_b[0], live_s[0]))
+        assert graph_sim.advance(True) == array_sim.advance(True)
+
+# Bulk weight functions must give the same market as their scalar forms
+def test_vectorized_weights():
+    for weight_func in (weights.inverse_squared_distance,
+                        weights.squared_distance,
+                        weights.squared_distance_over_deadlines):
+        def scalar_only(**kwargs):
+            return weight_func(**kwargs)
+        for backend in ("networkx", "array"):
+            bulk_sim = make_simulator(weight_func, backend)
+            scalar_sim = make_simulator(scalar_only, backend)
+            rng = np.random.RandomState(1)
+            for step in range(20):
+                for _ in range(rng.randint(0, 4)):
+                    node = dict(
+                        pos=(int(rng.randint(0, 10)), int(rng.randint(0, 10))),
+                        d=int(rng.randint(1, 5)),
+                        buyer=bool(rng.rand() < 0.5))
+                    bulk_sim.add_node(**node)
+                    scalar_sim.add_node(**node)
+                for b in bulk_sim.buyer_nodes:
+                    for s in bulk_sim.seller_nodes:
+                        assert bulk_sim.weight(b, s) == scalar_sim.weight(b, s)
+                bulk_sim.advance(True)
+                scalar_sim.advance(True)
+
+# d and k are derived from absolute ticks; check the examples in Simulator's docstring
+def test_timer_mechanics():
+    for backend in ("networkx", "array"):
+        sim = make_simulator(weight_function, backend)
+        sim.advance()
+        sim.add_node(pos=(0,0), d=2, buyer=True)          # node 0
+        sim.add_node(pos=(1,1), d=1, buyer=False, k=2)    # node 1
+        expected = [
+            # t, (d, k, in_market) of node 0, (d, k, in_market) of node 1
+            (1, (2, 0, True), (1, 2, False)),
+            (2, (1, 0, True), (1, 1, False)),
+            (3, None, (1, 0, True)),
+        ]
+        for t, state_0, state_1 in expected:
+            assert sim.t == t
+            for node, state in ((0, state_0), (1, state_1)):
+                if state is None:
+                    assert node not in sim.buyer_nodes | sim.seller_nodes
+                    continue
+                d, k, in_market = state
+                assert sim.node_attr(node, 'd') == d
+                assert sim.node_attr(node, 'k') == k
+                assert sim.node_attr(node, 'in_market') == in_market
+                assert sim.is_critical(node) == (d == 1)
+            sim.advance()
+        assert sim.t == 4 and not sim.seller_nodes
+
+# With a radius, only pairs within it get an edge, with the same weight as without
+def test_radius_pruning():
+    rng = np.random.RandomState(2)
+    grid = GridIndex(2.5)
+    points = {i: (float(x), float(y)) for i, (x, y) in enumerate(rng.uniform(-10, 10, size=(200, 2)))}
+    for i, pos in points.items():
+        grid.insert(i, pos)
+    for i in range(0, 200, 3):
+        grid.discard(i)
+    for radius in (0.5, 2.5, 6):
+        for center in ((0, 0), (-9.5, 3), (7.2, -7.2)):
+            expected = [i for i, (x, y) in points.items() if i % 3 != 0
+                        and (x - center[0])**2 + (y - center[1])**2 <= radius**2]
+            assert grid.within(center, radius) == expected
+
+    sparse_sim = Simulator(weight_function, radius=3)
+    dense_sim = Simulator(weight_function)
+    for step in range(40):
+        for _ in range(rng.randint(0, 4)):
+            node = dict(
+                pos=(int(rng.randint(0, 10)), int(rng.randint(0, 10))),
+                d=int(rng.randint(1, 5)),
+                buyer=bool(rng.rand() < 0.5))
+            sparse_sim.add_node(**node)
+            dense_sim.add_node(**node)
+        for b in dense_sim.buyer_nodes:
+            for s in dense_sim.seller_nodes:
+                (bx, by), (sx, sy) = dense_sim.node_attr(b, 'pos'), dense_sim.node_attr(s, 'pos')
+                near = (bx - sx)**2 + (by - sy)**2 <= 9
+                assert sparse_sim.has_edge(b, s) == near
+                if near:
+                    assert sparse_sim.weight(b, s) == dense_sim.weight(b, s)
+        for b in dense_sim.buyer_nodes:
+            assert [s for s, _ in sparse_sim.neighbors(b)] == \
+                [s for s in dense_sim.seller_nodes if sparse_sim.has_edge(b, s)]
+        W = sparse_sim.weight_submatrix(list(sparse_sim.buyer_nodes), list(sparse_sim.seller_nodes))
+        for i, b in enumerate(sparse_sim.buyer_nodes):
+            for j, s in enumerate(sparse_sim.seller_nodes):
+                assert W[i, j] == (sparse_sim.weight(b, s) if sparse_sim.has_edge(b, s) else 0)
+        assert sparse_sim.advance(True) == dense_sim.advance(True)
+    sparse_sim.reset()
+    assert len(sparse_sim._grids[True]) == len(sparse_sim._grids[False]) == 0
+    for radius in (0, -1):
+        try:
+            Simulator(weight_function, radius=radius)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("radius {} should be rejected".format(radius))
+
+# Candidate lists kept up to date incrementally must be the ones built from scratch
+def test_top_k_candidates():
+    def expected_candidates(sim, k):
+        top = {}
+        for node in sim.G:
+            ranked = sorted((-attrs['weight'], other) for other, attrs in sim.G._adj[node].items())
+            top[node] = {other for _, other in ranked[:k]}
+        return {node: sorted(top[node] | {o for o in sim.G._adj[node] if node in top[o]})
+                for node in sim.G}
+
+    def candidate_pairs(sim):
+        return {(b, s) for b in sim.buyer_nodes for s in sim.seller_nodes if sim.has_edge(b, s)}
+
+    for k, radius, recalc in ((1, None, False), (3, None, True), (2, 4, False)):
+        rng = np.random.RandomState(3)
+        sim = Simulator(weights.squared_distance_over_deadlines, radius=radius, top_k=k)
+        pairs_before, nodes_before, epoch = set(), set(), sim.weight_epoch
+        since = sim.candidate_changes()[1]
+        for step in range(60):
+            for _ in range(rng.randint(0, 5)):
+                sim.add_node(pos=(int(rng.randint(0, 10)), int(rng.randint(0, 10))),
+                             d=int(rng.randint(1, 6)), buyer=bool(rng.rand() < 0.5),
+                             k=int(rng.randint(0, 2)))
+            # between the nodes of the last check, the changes listed turn the
+            # candidate pairs of then into the ones of now (unless recalculated)
+            changes, since = sim.candidate_changes(since)
+            for b, s, added in changes:
+                (pairs_before.add if added else pairs_before.discard)((b, s))
+            pairs_now = candidate_pairs(sim)
+            if epoch == sim.weight_epoch:
+                assert {(b, s) for b, s in pairs_before if b in sim.G and s in sim.G} == \
+                    {(b, s) for b, s in pairs_now if b in nodes_before and s in nodes_before}
+            pairs_before, nodes_before, epoch = pairs_now, set(sim.G), sim.weight_epoch
+            expected = expected_candidates(sim, k)
+            for node in sim.G:
+                assert [other for other, _ in sim.neighbors(node)] == expected[node]
+            for b in sim.buyer_nodes:
+                for s in sim.seller_nodes:
+                    assert sim.has_edge(b, s) == (s in expected[b])
+            pairs = [(b, s) for b in sim.buyer_nodes for s, _ in sim.neighbors(b)
+                     if sim.node_attr(b, 'in_market') and sim.node_attr(s, 'in_market')]
+            if step % 2 == 0 and pairs:
+                sim.remove_matching(*pairs[-1])
+            sim.advance(recalc)
+
+# Incrementally kept snapshots must equal the in-market weights read pair by pair
+def test_snapshot():
+    for backend, kwargs in (("networkx", {}), ("networkx", dict(radius=3)),
+                            ("networkx", dict(top_k=2)), ("array", {})):
+        rng = np.random.RandomState(4)
+        sim = make_simulator(weights.squared_distance_over_deadlines, backend, **kwargs)
+        for step in range(150):
+            for _ in range(rng.randint(0, 5)):
+                sim.add_node(pos=(int(rng.randint(0, 10)), int(rng.randint(0, 10))),
+                             d=int(rng.randint(1, 6)), buyer=bool(rng.rand() < 0.5),
+                             k=int(rng.randint(0, 3)))
+            if step % 4 == 0:
+                continue   # snapshots skipped for a while must catch up
+            snap = sim.snapshot()
+            assert snap is sim.snapshot()
+            buyers = [b for b in sim.buyer_nodes if sim.node_attr(b, 'in_market')]
+            sellers = [s for s in sim.seller_nodes if sim.node_attr(s, 'in_market')]
+            assert snap.buyers.tolist() == buyers and snap.sellers.tolist() == sellers
+            assert all(snap.buyer_row[b] == i for i, b in enumerate(buyers))
+            assert all(snap.seller_col[s] == j for j, s in enumerate(sellers))
+            expected = np.array([[sim.weight(b, s) if sim.has_edge(b, s) else 0 for s in sellers]
+                                 for b in buyers]).reshape(len(buyers), len(sellers))
+            assert np.array_equal(snap.weights.toarray(), expected)
+            pairs = [(b, s) for b in buyers for s, _ in sim.neighbors(b) if s in snap.seller_col]
+            if step % 3 == 0 and pairs:
+                sim.remove_matching(*pairs[0])
+            sim.advance(step % 10 == 0)
+
+# Lazily computed weights must be the ones the eager simulator stores
+def test_lazy_weights():
+    for recalc_every, cache_size in ((0, 2**16), (3, 2**16), (2, 8)):
+        rng = np.random.RandomState(5)
+        eager = Simulator(weights.squared_distance_over_deadlines)
+        lazy = Simulator(weights.squared_distance_over_deadlines, lazy=True, cache_size=cache_size)
+        for step in range(60):
+            for _ in range(rng.randint(0, 5)):
+                node = dict(pos=(int(rng.randint(0, 10)), int(rng.randint(0, 10))),
+                            d=int(rng.randint(1, 6)), buyer=bool(rng.rand() < 0.5),
+                            k=int(rng.randint(0, 3)))
+                eager.add_node(**node)
+                lazy.add_node(**node)
+            assert lazy.G.number_of_edges() == 0
+            for b in eager.buyer_nodes:
+                assert list(lazy.neighbors(b)) == list(eager.neighbors(b))
+            for s in eager.seller_nodes:
+                assert list(lazy.neighbors(s)) == list(eager.neighbors(s))
+            buyers, sellers = list(eager.buyer_nodes), list(eager.seller_nodes)
+            assert np.array_equal(lazy.weight_submatrix(buyers, sellers),
+                                  eager.weight_submatrix(buyers, sellers))
+            assert np.array_equal(lazy.snapshot().weights.toarray(), eager.snapshot().weights.toarray())
+            assert len(lazy.weight_cache) <= cache_size
+            if step % 2 == 0 and buyers and sellers:
+                b, s = buyers[0], sellers[-1]
+                if eager.node_attr(b, 'in_market') and eager.node_attr(s, 'in_market'):
+                    assert lazy.remove_matching(b, s) == eager.remove_matching(b, s)
+            recalc = recalc_every > 0 and step % recalc_every == 0
+            assert lazy.advance(recalc) == eager.advance(recalc)
+        stats = lazy.weight_cache.stats()
+        assert stats["hits"] > 0 and stats["misses"] > 0 and stats["size"] <= cache_size
+    try:
+        Simulator(weight_function, top_k=2, lazy=True)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("lazy weights should not combine with top_k")
+
+# Weights rebuilt from the separable form must be the ones a full recalculation stores
+def test_separable_weights():
+    weight_func = weights.squared_distance_over_deadlines
+    def separable_only(**kwargs):
+        return weight_func(**kwargs)
+    separable_only.separable = weight_func.separable
+    # a bulk form is preferred: its recalculation is one call
+    assert Simulator(weight_func)._separable is None
+    assert Simulator(separable_only)._separable is weight_func.separable
+    for radius, recalc_every in ((None, 1), (None, 3), (4, 2)):
+        rng = np.random.RandomState(9)
+        full = Simulator(weight_func, radius=radius)
+        sep = Simulator(separable_only, radius=radius)
+        for step in range(60):
+            for _ in range(rng.randint(0, 5)):
+                node = dict(pos=(int(rng.randint(0, 10)), int(rng.randint(0, 10))),
+                            d=int(rng.randint(1, 6)), buyer=bool(rng.rand() < 0.5),
+                            k=int(rng.randint(0, 3)))
+                full.add_node(**node)
+                sep.add_node(**node)
+            for b in full.buyer_nodes:
+                assert list(sep.neighbors(b)) == list(full.neighbors(b))
+            buyers, sellers = list(full.buyer_nodes), list(full.seller_nodes)
+            assert np.array_equal(sep.weight_submatrix(buyers, sellers),
+                                  full.weight_submatrix(buyers, sellers))
+            assert np.array_equal(sep.snapshot().weights.toarray(), full.snapshot().weights.toarray())
+            pairs = [(b, s) for b in buyers for s, _ in full.neighbors(b)
+                     if full.node_attr(b, 'in_market') and full.node_attr(s, 'in_market')]
+            if step % 2 == 0 and pairs:
+                assert sep.remove_matching(*pairs[-1]) == full.remove_matching(*pairs[-1])
+            recalc = step % recalc_every == 0
+            assert sep.advance(recalc) == full.advance(recalc)
+            if recalc:
+                for s in full.seller_nodes:
+                    assert list(sep.neighbors(s)) == list(full.neighbors(s))
+                assert sep.weight_epoch == full.weight_epoch
+
 if __name__ == "__main__":
     main()
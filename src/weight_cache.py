@@ -0,0 +1,55 @@
+"""
+Bounded least-recently-used cache of edge weights, for Simulator(lazy=True).
+"""
+from collections import OrderedDict
+
+
+class WeightCache:
+    """LRU map (buyer, seller, weight_epoch) -> weight, holding at most maxsize entries
+
+    Instance variables:
+        maxsize : largest number of weights kept
+        hits    : lookups answered from the cache
+        misses  : lookups that were not
+    """
+
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError("cache size must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached weight of key, None on a miss"""
+        weight = self._entries.get(key)
+        if weight is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return weight
+
+    def put(self, key, weight):
+        self._entries[key] = weight
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops all weights (statistics are kept)"""
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
@@ -0,0 +1,142 @@
+"""
+Weight functions for the market simulators.
+
+A weight function is called once per (buyer, seller) pair:
+    weight_func(buyer_pos, buyer_d, seller_pos, seller_d) -> float
+
+It can optionally carry a bulk form in a `vectorized` attribute (see the
+vectorized decorator below):
+    weight_func.vectorized(buyer_pos, buyer_d, seller_pos, seller_d) -> (B, S) array
+with buyer_pos a (B, 2) array, buyer_d a (B,) array, seller_pos a (S, 2)
+array and seller_d a (S,) array. The simulators use the bulk form when it is
+present, so adding a node or recalculating weights costs one call instead of
+one call per pair, and fall back to the scalar form otherwise.
+
+A weight function whose dependence on d factors out per node can also
+declare that in a `separable` attribute (see the separable decorator):
+    weight = combine(static(buyer_pos, seller_pos), buyer_factor(buyer_d), seller_factor(seller_d))
+If it has no bulk form, Simulator then keeps the static part on each edge,
+and advance(recalc_weights=True) only computes the factors of the nodes and
+combines them with the static parts in one vectorized pass, instead of
+calling the scalar form for all B*S pairs. A bulk form, when present, is
+used instead.
+"""
+import numpy as np
+
+
+def vectorized(bulk_func):
+    """Decorator attaching bulk_func as the vectorized form of a weight function
+    """
+    def attach(weight_func):
+        weight_func.vectorized = bulk_func
+        return weight_func
+    return attach
+
+
+class Separable:
+    """Split of a weight function into a static pairwise part and per-node factors
+
+    Instance variables:
+        static        : (buyer_pos (B, 2), seller_pos (S, 2)) -> (B, S) array
+        buyer_factor  : array of buyer d -> array of factors (None: d itself)
+        seller_factor : array of seller d -> array of factors (None: d itself)
+        combine       : (static, buyer factor, seller factor) -> weight, elementwise
+                        (None: the product)
+    """
+
+    def __init__(self, static, buyer_factor=None, seller_factor=None, combine=None):
+        self.static = static
+        self.buyer_factor = buyer_factor
+        self.seller_factor = seller_factor
+        self.combine = combine if combine is not None else lambda w, b, s: w * b * s
+
+    def static_weights(self, buyer_pos, seller_pos):
+        """Static parts of every buyer against every seller, as a (B, S) array"""
+        return np.asarray(self.static(np.asarray(buyer_pos, dtype=float).reshape(-1, 2),
+                                      np.asarray(seller_pos, dtype=float).reshape(-1, 2)), dtype=float)
+
+    def factors(self, d, buyer):
+        """Factors of nodes with departure times d (buyers if buyer, else sellers), as an array"""
+        factor = self.buyer_factor if buyer else self.seller_factor
+        d = np.asarray(d)
+        return d if factor is None else np.asarray(factor(d))
+
+
+def separable(static, buyer_factor=None, seller_factor=None, combine=None):
+    """Decorator attaching a Separable form to a weight function (see Separable)
+    """
+    def attach(weight_func):
+        weight_func.separable = Separable(static, buyer_factor, seller_factor, combine)
+        return weight_func
+    return attach
+
+
+def pairwise_weights(weight_func, buyer_pos, buyer_d, seller_pos, seller_d):
+    """Weights of every buyer against every seller, as a (B, S) array
+
+    Args:
+        weight_func         : weight function (vectorized form used if present)
+        buyer_pos, buyer_d  : sequences of buyer positions and departure times
+        seller_pos, seller_d: sequences of seller positions and departure times
+    """
+    bulk = getattr(weight_func, 'vectorized', None)
+    if bulk is not None:
+        return np.asarray(bulk(
+            buyer_pos=np.asarray(buyer_pos, dtype=float).reshape(-1, 2),
+            buyer_d=np.asarray(buyer_d),
+            seller_pos=np.asarray(seller_pos, dtype=float).reshape(-1, 2),
+            seller_d=np.asarray(seller_d)
+        ), dtype=float)
+
+    weights = np.empty((len(buyer_d), len(seller_d)))
+    for i, (b_pos, b_d) in enumerate(zip(buyer_pos, buyer_d)):
+        for j, (s_pos, s_d) in enumerate(zip(seller_pos, seller_d)):
+            weights[i, j] = weight_func(
+                buyer_pos=tuple(b_pos),
+                buyer_d=b_d,
+                seller_pos=tuple(s_pos),
+                seller_d=s_d
+            )
+    return weights
+
+
+def _squared_distances(buyer_pos, seller_pos):
+    dx = buyer_pos[:, None, 0] - seller_pos[None, :, 0]
+    dy = buyer_pos[:, None, 1] - seller_pos[None, :, 1]
+    return dx**2 + dy**2
+
+
+# Weight functions used in comp_algs.py, the notebooks and the tests
+
+def _inverse_squared_distance_bulk(buyer_pos, buyer_d, seller_pos, seller_d):
+    return 1.0/(_squared_distances(buyer_pos, seller_pos) + 1)
+
+
+@vectorized(_inverse_squared_distance_bulk)
+def inverse_squared_distance(buyer_pos, buyer_d, seller_pos, seller_d):
+    bx, by = buyer_pos
+    sx, sy = seller_pos
+    return 1.0/((bx-sx)**2 + (by-sy)**2 + 1)
+
+
+def _squared_distance_bulk(buyer_pos, buyer_d, seller_pos, seller_d):
+    return _squared_distances(buyer_pos, seller_pos)
+
+
+@vectorized(_squared_distance_bulk)
+def squared_distance(buyer_pos, buyer_d, seller_pos, seller_d):
+    bx, by = buyer_pos
+    sx, sy = seller_pos
+    return (bx-sx)**2 + (by-sy)**2
+
+
+def _squared_distance_over_deadlines_bulk(buyer_pos, buyer_d, seller_pos, seller_d):
+    return _squared_distances(buyer_pos, seller_pos) / buyer_d[:, None] / seller_d[None, :]
+
+
+@separable(_squared_distances, combine=lambda w, b, s: w / b / s)
+@vectorized(_squared_distance_over_deadlines_bulk)
+def squared_distance_over_deadlines(buyer_pos, buyer_d, seller_pos, seller_d):
+    bx, by = buyer_pos
+    sx, sy = seller_pos
+    return ((bx-sx)**2 + (by-sy)**2) / buyer_d / seller_d